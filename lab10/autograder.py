@@ -1,87 +1,160 @@
 from grid import *
 from visualizer import *
 from planning import *
-import sys
+from multiprocessing import Pool
+import argparse
+import os
 import threading
 import json
 
 
+def grade(grid, solution, planner=astar):
+    """Run a planner on a grid and score the result against a solution
+
+        Arguments:
+        grid -- CozGrid instance to plan on
+        solution -- dictionary with the allowed 'expanded' and 'pathlen'
+        planner -- planner function taking (grid, heuristic)
+
+        Returns (points, list of report lines)
+    """
+    report = []
+    planner(grid, heuristic)
+    points = 0
+    
+    if len(grid.getVisited()) <= solution['expanded'] and len(grid.getVisited()) > 0:
+        report.append("Acceptable number of expanded nodes!")
+        report.append("Expanded nodes: " + str(len(grid.getVisited())))
+        report.append("1.0/1.0 points")
+        points += 1.0
+    elif len(grid.getVisited()) == 0:
+        report.append("No expanded nodes!")
+        report.append("Yours: " + str(len(grid.getVisited())))
+        report.append("Solution: " + str(solution['expanded']))
+        report.append("0/1.0 points")
+    else:
+        report.append("Too many expanded nodes!")
+        report.append("Yours: " + str(len(grid.getVisited())))
+        report.append("Solution: " + str(solution['expanded']))
+        report.append("0/1.0 points")
+
+    report.append("")
+    pathlen = grid.checkPath()
+    if pathlen < 0:
+        report.append("Path invalid! Intersects obstacles or has moves > 1 grid space.")
+        report.append("0/2.0 points")
+    elif pathlen == 0:
+        report.append("There is no path! Make sure you're using grid.setPath")
+        report.append("0/2.0 points")
+    elif grid.getPath()[0] != grid.getStart():
+        report.append("Path does not include start point!")
+        report.append("0/2.0 points")
+    elif grid.getPath()[-1] not in grid.getGoals():
+        report.append("Path does not reach goal!")
+        report.append("0/2.0 points")
+    elif pathlen <= solution['pathlen']:
+        report.append("Correct path length!")
+        report.append("Path length: " + str(pathlen))
+        report.append("2.0/2.0 points")
+        points += 2.0
+    else:
+        report.append("Incorrect path length!")
+        report.append("Yours: " + str(pathlen))
+        report.append("Solution: " + str(solution['pathlen']))
+        report.append("0/2.0 points")
+        
+    report.append("\nScore = " + str(points) + "/3.0\n")
+    return points, report
+
+
+def load_test(fname):
+    """Load a test file, its map file is looked up next to it
+    """
+    try:
+        with open(fname) as testfile:
+            test = json.loads(testfile.read())
+    except:
+        print("Error opening test file, please check filename and json format")
+        raise
+    test['mapfile'] = os.path.join(os.path.dirname(fname), test['mapfile'])
+    return test
+
+
+def grade_file(job):
+    """Grade one test file on a headless grid, used by batch grading
+
+        Arguments:
+        job -- (test file name, planner name)
+
+        Returns (test file name, points, list of report lines)
+    """
+    fname, plannername = job
+    test = load_test(fname)
+    grid = CozGrid(test['mapfile'], headless=True)
+    points, report = grade(grid, test['solution'], PLANNERS[plannername])
+    return fname, points, report
+
+
+def print_results(results, count):
+    """Print the reports of batch graded test files and the total score
+
+        Arguments:
+        results -- iterable of grade_file results
+        count -- number of test files
+    """
+    total = 0.0
+    for fname, points, report in results:
+        print("==== " + fname + " ====")
+        for line in report:
+            print(line)
+        total += points
+    print("Total score = " + str(total) + "/" + str(3.0 * count))
+
+
 # Thread to grade A* algorithm
 class GradingThread(threading.Thread):
 
-    def __init__(self, grid, solution):
+    def __init__(self, grid, solution, planner=astar):
         threading.Thread.__init__(self, daemon=True)
         self.grid = grid
         self.solution = solution
+        self.planner = planner
 
     def run(self):
         print("Grader running...\n")
-        astar(self.grid, heuristic)
-        points = 0
-        
-        if len(self.grid.getVisited()) <= self.solution['expanded'] and len(self.grid.getVisited()) > 0:
-            print("Acceptable number of expanded nodes!")
-            print("Expanded nodes: " + str(len(self.grid.getVisited())))
-            print("1.0/1.0 points")
-            points += 1.0
-        elif len(self.grid.getVisited()) == 0:
-            print("No expanded nodes!")
-            print("Yours: " + str(len(self.grid.getVisited())))
-            print("Solution: " + str(self.solution['expanded']))
-            print("0/1.0 points")
-        else:
-            print("Too many expanded nodes!")
-            print("Yours: " + str(len(self.grid.getVisited())))
-            print("Solution: " + str(self.solution['expanded']))
-            print("0/1.0 points")
-
-        print()
-        pathlen = self.grid.checkPath()
-        if pathlen < 0:
-            print("Path invalid! Intersects obstacles or has moves > 1 grid space.")
-            print("0/2.0 points")
-        elif pathlen == 0:
-            print("There is no path! Make sure you're using grid.setPath")
-            print("0/2.0 points")
-        elif grid.getPath()[0] != grid.getStart():
-            print("Path does not include start point!")
-            print("0/2.0 points")
-        elif grid.getPath()[-1] not in grid.getGoals():
-            print("Path does not reach goal!")
-            print("0/2.0 points")
-        elif pathlen <= self.solution['pathlen']:
-            print("Correct path length!")
-            print("Path length: " + str(pathlen))
-            print("2.0/2.0 points")
-            points += 2.0
-        else:
-            print("Incorrect path length!")
-            print("Yours: " + str(pathlen))
-            print("Solution: " + str(self.solution['pathlen']))
-            print("0/2.0 points")
-            
-        print("\nScore = " + str(points) + "/3.0\n")
+        points, report = grade(self.grid, self.solution, self.planner)
+        for line in report:
+            print(line)
 
         print("Close visualizer window to exit")
 
 
 if __name__ == "__main__":
-    test = {}
-    if len(sys.argv) > 1:
-        try:
-            with open(sys.argv[1]) as testfile:
-                test = json.loads(testfile.read())
-        except:
-            print("Error opening test file, please check filename and json format")
-            raise
-    else:
-        print("correct usage: python3 autograder.py <testfile>")
+    parser = argparse.ArgumentParser(description='Grade a planner on test files')
+    parser.add_argument('testfiles', nargs='+', metavar='testfile')
+    # the expansion limits of the test files are set for astar, the other
+    # planners expand cells in a different order and can go over them
+    parser.add_argument('--planner', default='astar', choices=sorted(PLANNERS),
+                        help='planner to grade, the expansion limits assume astar')
+    parser.add_argument('--headless', action='store_true',
+                        help='grade without the visualizer, always the case for several test files')
+    parser.add_argument('--jobs', type=int, default=1, help='number of processes grading test files in parallel')
+    args = parser.parse_args()
+
+    if args.headless or len(args.testfiles) > 1:
+        jobs = [(fname, args.planner) for fname in args.testfiles]
+        if args.jobs > 1:
+            with Pool(args.jobs) as pool:
+                print_results(pool.imap(grade_file, jobs), len(jobs))
+        else:
+            print_results(map(grade_file, jobs), len(jobs))
         exit()
-            
+
+    test = load_test(args.testfiles[0])
     grid = CozGrid(test['mapfile'])
     visualizer = Visualizer(grid)
     updater = UpdateThread(visualizer)
     updater.start()
-    grader = GradingThread(grid, test['solution'])
+    grader = GradingThread(grid, test['solution'], PLANNERS[args.planner])
     grader.start()
     visualizer.start()
@@ -0,0 +1,198 @@
+from grid import *
+from planning import *
+import argparse
+import heapq
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+# Benchmark of the planners in planning.PLANNERS on generated maps
+#
+# Runs without a Visualizer or UpdateThread and writes one JSON object per
+# (map, planner) run, so results of two versions of the planners can be
+# compared with any JSON tool. Example:
+#
+#   python3 benchmark.py --types random maze --sizes 50 100 200 --output results.jsonl
+
+
+def random_layout(width, height, rng, density=0.2):
+    """Obstacles placed independently in each cell with probability density
+    """
+    return [['X' if rng.random() < density else '.' for _ in range(width)] for _ in range(height)]
+
+
+def cluttered_layout(width, height, rng, coverage=0.25):
+    """Rectangular blocks of random size until about coverage of the map is covered
+    """
+    layout = [['.'] * width for _ in range(height)]
+    covered = 0
+    while covered < coverage * width * height:
+        w = rng.randint(1, max(1, width // 8))
+        h = rng.randint(1, max(1, height // 8))
+        x = rng.randrange(width)
+        y = rng.randrange(height)
+        for row in range(y, min(y + h, height)):
+            for col in range(x, min(x + w, width)):
+                if layout[row][col] == '.':
+                    layout[row][col] = 'X'
+                    covered += 1
+    return layout
+
+
+def maze_layout(width, height, rng):
+    """Maze with one cell wide corridors carved by a randomized depth-first search
+    """
+    layout = [['X'] * width for _ in range(height)]
+    stack = [(0, 0)]
+    layout[0][0] = '.'
+    while stack:
+        x, y = stack[-1]
+        options = [(dx, dy) for dx, dy in ((2, 0), (-2, 0), (0, 2), (0, -2))
+                   if 0 <= x + dx < width and 0 <= y + dy < height and layout[y + dy][x + dx] == 'X']
+        if not options:
+            stack.pop()
+            continue
+        dx, dy = rng.choice(options)
+        layout[y + dy // 2][x + dx // 2] = '.'
+        layout[y + dy][x + dx] = '.'
+        stack.append((x + dx, y + dy))
+    return layout
+
+
+MAP_TYPES = {
+    'random': random_layout,
+    'cluttered': cluttered_layout,
+    'maze': maze_layout,
+}
+
+
+def generate_map(maptype, size, seed, directory):
+    """Write a generated size x size map to a json file CozGrid can load
+
+        The start is the bottom left cell and the goal the top right free
+        cell nearest to the corner, both cleared of obstacles
+
+        Returns the file name
+    """
+    rng = random.Random(seed)
+    layout = MAP_TYPES[maptype](size, size, rng)
+    # layout rows here are indexed by y, the json file lists rows top-down
+    layout[0][0] = 'S'
+    gx, gy = size - 1, size - 1
+    if maptype == 'maze':
+        # maze corridors are on even cells only
+        gx, gy = gx - gx % 2, gy - gy % 2
+    layout[gy][gx] = 'G'
+    config = {'width': size, 'height': size, 'scale': 25,
+              'layout': [''.join(row) for row in reversed(layout)]}
+    fname = os.path.join(directory, '%s_%d_%d.json' % (maptype, size, seed))
+    with open(fname, 'w') as mapfile:
+        json.dump(config, mapfile)
+    return fname
+
+
+def optimal_length(grid):
+    """Length of the shortest path from start to the first goal (Dijkstra),
+        None if the goal cannot be reached
+    """
+    start = grid.getStart()
+    goal = grid.getGoals()[0]
+    costs = {start: 0.0}
+    openheap = [(0.0, start)]
+    while openheap:
+        cost, coord = heapq.heappop(openheap)
+        if coord == goal:
+            return cost
+        if cost > costs[coord]:
+            continue
+        for ncoord, weight in grid.getNeighbors(coord):
+            calc_cost = cost + weight
+            if calc_cost < costs.get(ncoord, float('inf')):
+                costs[ncoord] = calc_cost
+                heapq.heappush(openheap, (calc_cost, ncoord))
+    return None
+
+
+def run_planner(planner, makeheuristic, fname, repeat):
+    """Run a planner on fresh grids loaded from fname, with the heuristic
+        makeheuristic builds for each grid. Building and filling any
+        heuristic tables is part of the timed run
+
+        Wall time is the best of repeat runs, memory is the peak traced by
+        tracemalloc in one extra run, since tracing slows the planner down
+
+        Returns (grid of the last timed run, seconds, peak bytes)
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        grid = CozGrid(fname, headless=True)
+        started = time.perf_counter()
+        planner(grid, makeheuristic(grid))
+        best = min(best, time.perf_counter() - started)
+
+    traced = CozGrid(fname, headless=True)
+    tracemalloc.start()
+    planner(traced, makeheuristic(traced))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return grid, best, peak
+
+
+def benchmark(maptypes, sizes, planners, seeds, repeat, directory, heuristics=('euclidean',)):
+    """Yield one result dictionary per (map type, size, seed, planner, heuristic)
+    """
+    for maptype in maptypes:
+        for size in sizes:
+            for seed in seeds:
+                fname = generate_map(maptype, size, seed, directory)
+                optimal = optimal_length(CozGrid(fname, headless=True))
+                for name in planners:
+                    for heuristicname in heuristics:
+                        grid, seconds, peak = run_planner(PLANNERS[name], HEURISTICS[heuristicname], fname, repeat)
+                        pathlen = grid.checkPath()
+                        path = grid.getPath()
+                        valid = pathlen > 0 and path[0] == grid.getStart() and path[-1] in grid.getGoals()
+                        yield {
+                            'map': maptype,
+                            'size': size,
+                            'seed': seed,
+                            'planner': name,
+                            'heuristic': heuristicname,
+                            'time_s': seconds,
+                            'expanded': len(grid.getVisited()),
+                            'peak_memory_bytes': peak,
+                            'pathlen': pathlen,
+                            'optimal_pathlen': optimal,
+                            'optimality': pathlen / optimal if valid and optimal else None,
+                            'valid': valid,
+                            'reachable': optimal is not None,
+                        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark lab10 planners on generated maps')
+    parser.add_argument('--types', nargs='+', default=sorted(MAP_TYPES), choices=sorted(MAP_TYPES))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[25, 50, 100, 200])
+    parser.add_argument('--planners', nargs='+', default=sorted(PLANNERS), choices=sorted(PLANNERS))
+    parser.add_argument('--heuristics', nargs='+', default=['euclidean'], choices=sorted(HEURISTICS))
+    parser.add_argument('--seeds', nargs='+', type=int, default=[0])
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per planner, the best is reported')
+    parser.add_argument('--maps', help='directory to keep the generated maps in, temporary if not given')
+    parser.add_argument('--output', help='file to write json lines to, stdout if not given')
+    args = parser.parse_args()
+
+    out = open(args.output, 'w') if args.output else sys.stdout
+    with tempfile.TemporaryDirectory() as tmpdir:
+        directory = args.maps or tmpdir
+        os.makedirs(directory, exist_ok=True)
+        for result in benchmark(args.types, args.sizes, args.planners, args.seeds, args.repeat, directory,
+                                args.heuristics):
+            out.write(json.dumps(result) + '\n')
+            out.flush()
+    if args.output:
+        out.close()
@@ -2,21 +2,30 @@ import json
 import threading
 import math
 
+# Neighbor offsets of an 8-connected cell and their move costs, in the
+# order getNeighbors has always listed them
+_OFFSETS = [(i, j, math.sqrt(math.pow(i,2) + math.pow(j,2))) for i in range(-1,2,1) for j in range(-1,2,1) if (i, j) != (0, 0)]
+
+
 class CozGrid:
     """Class representing an 8-connected grid for search algorithms.
 
         Features include: start cell, goal cells, obstacle cells, visited cells, and path storage
         Configuration is loaded from json file supplied at object creation
         Designed to be thread-safe
+        A headless grid skips all bookkeeping for the visualizer, for use
+        when nothing is displayed (batch grading, benchmarks)
 
         Attributes:
         width -- width of grid, in cells
         height -- height of grid, in cells
         scale -- scale of grid cell, in mm
+        headless -- True if no visualizer is attached
     """
         
 
-    def __init__(self, fname):
+    def __init__(self, fname, headless=False):
+        self.headless = headless
         with open(fname) as configfile:
 
             # Load dimensions from json file
@@ -28,7 +37,10 @@ class CozGrid:
             # Initially empty private data, please access through functions below
             self._start = None
             self._goals = []
-            self._obstacles = []
+            self._obstacles = set()
+            self._obstacleVersion = 0
+            self._occupied = bytearray(self.width * self.height)
+            self._neighbors = [None] * (self.width * self.height)
             self._visited = set()
             self._newvisited = []
             self._path = []
@@ -44,7 +56,7 @@ class CozGrid:
                     elif entry == 'G':
                         self._goals.append(coord)
                     elif entry == 'X':
-                        self._obstacles.append(coord)
+                        self._markObstacle(coord)
 
             # For coordination with visualization
             self.lock = threading.Lock()
@@ -54,26 +66,76 @@ class CozGrid:
 
     def getNeighbors(self, coord):
         """Get the valid neighbors of a cell and their weights
+            Neighbor lists are computed once per cell and kept until an
+            obstacle next to the cell changes, do not modify the returned list
 
             Arguments:
             coord -- grid coordinates of grid cell
 
             Returns list of (coordinate, weight) pairs
         """
-        
+
+        if not self.coordInBounds(coord):
+            return self._findNeighbors(coord)
+        cellid = coord[0] + coord[1] * self.width
+        neighbor = self._neighbors[cellid]
+        if neighbor is None:
+            neighbor = self._findNeighbors(coord)
+            self._neighbors[cellid] = neighbor
+        return neighbor
+
+
+    def _findNeighbors(self, coord):
+        """Compute the neighbor list of a cell, see getNeighbors
+        """
+
         neighbor = []
         x = coord[0]
         y = coord[1]
 
-        for i in range(-1,2,1):
-            for j in range(-1,2,1):
-                n = (x + i, y + j)
-                if n != coord and self.coordInBounds(n) and n not in self._obstacles:
-                    neighbor.append((n,math.sqrt(math.pow(i,2) + math.pow(j,2))))
+        for i, j, weight in _OFFSETS:
+            n = (x + i, y + j)
+            if self.coordInBounds(n) and not self._occupied[n[0] + n[1] * self.width]:
+                neighbor.append((n, weight))
 
         return neighbor
 
 
+    def _markObstacle(self, coord):
+        """Record an obstacle cell and drop the cached neighbor lists around it
+        """
+
+        self._obstacles.add(coord)
+        self._obstacleVersion += 1
+        if self.coordInBounds(coord):
+            self._occupied[coord[0] + coord[1] * self.width] = 1
+            self._invalidateNeighbors(coord)
+
+
+    def _invalidateNeighbors(self, coord):
+        """Drop the cached neighbor lists of the cells around coord
+        """
+
+        for i, j, _ in _OFFSETS:
+            n = (coord[0] + i, coord[1] + j)
+            if self.coordInBounds(n):
+                self._neighbors[n[0] + n[1] * self.width] = None
+
+
+    def isObstacle(self, coord):
+        """Check if a cell is an obstacle
+
+            Arguments:
+            coord -- grid coordinates
+
+            Returns True if coord is an obstacle cell, else False
+        """
+
+        if self.coordInBounds(coord):
+            return self._occupied[coord[0] + coord[1] * self.width] == 1
+        return coord in self._obstacles
+
+
     def checkPath(self):
         """Checks if the current path is valid, and if so returns its length
 
@@ -100,6 +162,20 @@ class CozGrid:
         self.lock.release()
         return pathlen
 
+    def _changed(self, change):
+        """Tell the visualizer that part of the grid changed, must hold the lock
+            Each kind of change is listed once until the visualizer redraws
+
+            Arguments:
+            change -- name of the changed part, see Visualizer.update
+        """
+
+        if not self.headless:
+            self.updated.set()
+            if change not in self.changes:
+                self.changes.append(change)
+
+
     def coordInBounds(self, coord):
         """Check if a set of coordinates is in the grid bounds
 
@@ -122,11 +198,13 @@ class CozGrid:
             coord -- grid coordinates of visited cell
         """
         
+        if self.headless:
+            self._visited.add(coord)
+            return
         self.lock.acquire()
         self._visited.add(coord)
         self._newvisited.append(coord)
-        self.updated.set()
-        self.changes.append('visited')
+        self._changed('visited')
         self.lock.release()
 
 
@@ -145,8 +223,7 @@ class CozGrid:
         
         self.lock.acquire()
         self._visited = set()
-        self.updated.set()
-        self.changes.append('allvisited')
+        self._changed('allvisited')
         self.lock.release()
 
 
@@ -158,9 +235,8 @@ class CozGrid:
         """
         
         self.lock.acquire()
-        self._obstacles.append(coord)
-        self.updated.set()
-        self.changes.append('obstacles')
+        self._markObstacle(coord)
+        self._changed('obstacles')
         self.lock.release()
 
 
@@ -172,9 +248,9 @@ class CozGrid:
         """
 
         self.lock.acquire()
-        self._obstacles += coords
-        self.updated.set()
-        self.changes.append('obstacles')
+        for coord in coords:
+            self._markObstacle(coord)
+        self._changed('obstacles')
         self.lock.release()
 
 
@@ -183,12 +259,35 @@ class CozGrid:
         """
         
         self.lock.acquire()
-        self._obstacles = []
-        self.updated.set()
-        self.changes.append('obstacles')
+        for coord in self._obstacles:
+            if self.coordInBounds(coord):
+                self._occupied[coord[0] + coord[1] * self.width] = 0
+                self._invalidateNeighbors(coord)
+        self._obstacles = set()
+        self._obstacleVersion += 1
+        self._changed('obstacles')
         self.lock.release()
 
 
+    def getObstacles(self):
+        """Get the set of obstacle cells
+
+            Returns: set of coordinates of obstacle cells
+        """
+        
+        return self._obstacles
+
+
+    def getObstacleVersion(self):
+        """Get a counter that changes whenever obstacles are added or cleared,
+            useful to invalidate anything computed from the obstacles
+
+            Returns: integer version
+        """
+        
+        return self._obstacleVersion
+
+
     def addGoal(self, coord):
         """Add a goal cell
 
@@ -198,8 +297,7 @@ class CozGrid:
         
         self.lock.acquire()
         self._goals.append(coord)
-        self.updated.set()
-        self.changes.append('goals')
+        self._changed('goals')
         self.lock.release()
 
 
@@ -209,8 +307,7 @@ class CozGrid:
         
         self.lock.acquire()
         self._goals = []
-        self.updated.set()
-        self.changes.append('goals')
+        self._changed('goals')
         self.lock.release()
 
 
@@ -232,8 +329,7 @@ class CozGrid:
         
         self.lock.acquire()
         self._start = coord
-        self.updated.set()
-        self.changes.append('start')
+        self._changed('start')
         self.lock.release()
 
 
@@ -243,8 +339,7 @@ class CozGrid:
         
         self.lock.acquire()
         self._start = None
-        self.updated.set()
-        self.changes.append('start')
+        self._changed('start')
         self.lock.release()
 
 
@@ -266,8 +361,7 @@ class CozGrid:
 
         self.lock.acquire()
         self._path = path
-        self.updated.set()
-        self.changes.append('path')
+        self._changed('path')
         self.lock.release()
 
 
@@ -286,8 +380,7 @@ class CozGrid:
         
         self.lock.acquire()
         self._path = []
-        self.updated.set()
-        self.changes.append('path')
+        self._changed('path')
         self.lock.release()
 
     def getScale(self):
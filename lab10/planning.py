@@ -5,7 +5,8 @@
 from grid import *
 from visualizer import *
 import threading
-from queue import PriorityQueue
+import heapq
+import itertools
 import math
 import cozmo
 import time
@@ -17,72 +18,454 @@ from cozmo.util import degrees, Angle, Pose, distance_mm, speed_mmps
 def astar(grid, heuristic):
     """Perform the A* search algorithm on a defined grid
 
+        Plans to the nearest of the grid's goals, using the smallest
+        heuristic over all of them
+
         Arguments:
         grid -- CozGrid instance to perform search on
-        grid -- CozGrid instance to perform search on
         heuristic -- supplied heuristic function
     """
-    evaluatedMap = {}
-    unevaluatedMap = {}
     start = grid.getStart()
-    goal = grid.getGoals()[0]
-    startG = 0
-    startH = heuristic(start,goal)
-    currentNode = Node(start,startH,startG)
-    unevaluatedMap[currentNode.coord] = currentNode
-    
-    while len(unevaluatedMap) > 0:
-        # I tried using a PriorityQueue but because a node could end up with 
-        # an updated priority it really didn't make sense to use one and
-        # instead had to just serach the dictionary each time for the smallest
-        # priority which is the sum of g and h
-        currentNode = min(unevaluatedMap.values(),key=lambda x:x.g + x.h)
-        
-        # if the current node is the goal then create the path by iterating backwards
-        # and pushing the current node to the front of the path and then moving to the
-        # parent node
-        if currentNode.coord == goal:
+    goals = grid.getGoals()
+    width = grid.width
+    goalids = set(x + y * width for x, y in goals)
+
+    # Per cell bookkeeping lives in flat lists indexed by cell id x + y * width,
+    # and the heuristic of a cell is only computed the first time it is seen
+    size = width * grid.height
+    costs = [float('inf')] * size
+    parents = [-1] * size
+    hcache = [-1.0] * size
+    evaluated = bytearray(size)
+    masks, moves = free_neighbor_moves(grid)
+    sqrt = math.sqrt
+    gx, gy = goals[0]
+    # The euclidean heuristic to a single goal is computed inline
+    inline = heuristic is _euclidean and len(goals) == 1
+    heappush = heapq.heappush
+    heappop = heapq.heappop
+    addVisited = grid.addVisited
+
+    # The open set is a binary heap with lazy deletion. When a cell gets a
+    # cheaper cost it is pushed again and the stale entry is skipped when it
+    # is popped, which is what a PriorityQueue could not do for us. Ties on
+    # f = g + h (in integer units of 1e-9, so float noise does not hide them)
+    # go to the entry with the smaller h, then to the entry pushed first.
+    # With an exact heuristic this walks straight down one optimal path
+    startid = start[0] + start[1] * width
+    costs[startid] = 0
+    openheap = [(int(min(heuristic(start, goal) for goal in goals) * 1e9 + 0.5), 0, 0, startid)]
+    pushed = 1
+
+    while openheap:
+        cellid = heappop(openheap)[3]
+        if evaluated[cellid]:
+            continue
+
+        # if the current node is the goal then create the path by following
+        # the parents back to the start
+        if cellid in goalids:
             path = []
-            while currentNode.parentNode:
-                path.insert(0,currentNode.coord)
-                currentNode = currentNode.parentNode
-            path.insert(0,currentNode.coord)
+            while cellid != -1:
+                path.append((cellid % width, cellid // width))
+                cellid = parents[cellid]
+            path.reverse()
             grid.setPath(path)
             return
-            
-        # Move the current node to the evaluated map and delete it from
-        # the unevaluated map
-        evaluatedMap[currentNode.coord] = currentNode
-        del unevaluatedMap[currentNode.coord]
-        
+
+        evaluated[cellid] = 1
+
         # Mark the current node as having been visited
-        grid.addVisited(currentNode.coord)
-        
-        # Get the neighbors of the current node
-        neighbors = grid.getNeighbors(currentNode.coord)
-
-        # For each neighbor check if that neighbor has alread been evaluated
-        # if it has then skip that neighbor.  If it hasn't and it isn't in the
-        # unevaluated map add it with a high cost and heuristic.
-        # Get the neighbor from the unevaluated map and calculate the current
-        # cost.  If the current cost is less than what existed update the neighbor
-        # and add it back to the list otherwise skip to next neighbor
-        for neighbor in neighbors:
-            ncoord = (neighbor[0])
-            if (ncoord) in evaluatedMap:
+        y, x = divmod(cellid, width)
+        addVisited((x, y))
+
+        # Relax every neighbor that has not been evaluated yet, and push it
+        # if the cost through the current node is lower than what it had
+        g = costs[cellid]
+        for i, j, step, weight in moves[masks[cellid]]:
+            nid = cellid + step
+            if evaluated[nid]:
                 continue
-            if (ncoord) not in unevaluatedMap:
-                node = Node(ncoord,float('inf'),float('inf'))
-                unevaluatedMap[ncoord] = node
-            
-            node = unevaluatedMap[ncoord]
-            calc_cost = currentNode.g + neighbor[1]
-            if calc_cost >= node.g:
+            calc_cost = g + weight
+            if calc_cost >= costs[nid]:
+                continue
+            costs[nid] = calc_cost
+            parents[nid] = cellid
+            h = hcache[nid]
+            if h < 0:
+                if inline:
+                    dx = x + i - gx
+                    dy = y + j - gy
+                    h = sqrt(dx * dx + dy * dy)
+                else:
+                    ncoord = (x + i, y + j)
+                    h = min(heuristic(ncoord, goal) for goal in goals)
+                hcache[nid] = h
+            heappush(openheap, (int((calc_cost + h) * 1e9 + 0.5), h, pushed, nid))
+            pushed += 1
+
+
+def jps(grid, heuristic):
+    """Perform Jump Point Search on a defined grid
+
+        A* over jump points only: straight and diagonal runs through open
+        space are skipped in one step, which works because CozGrid is
+        8-connected with uniform costs. Only the jump points are marked as
+        visited, and the path set on the grid is expanded back into
+        adjacent-cell steps so checkPath accepts it
+
+        Plans to the nearest of the grid's goals, using the smallest
+        heuristic over all of them
+
+        Arguments:
+        grid -- CozGrid instance to perform search on
+        heuristic -- supplied heuristic function
+    """
+    start = grid.getStart()
+    goals = grid.getGoals()
+    width = grid.width
+    height = grid.height
+
+    # Runs are walked by flat cell id over a copy of the occupancy bytes with
+    # a blocked border around it, so each probe is one lookup and needs no
+    # bounds check. Cell ids below are ids on the padded map
+    rowstep = width + 2
+    padded = np.ones((height + 2, rowstep), dtype=np.uint8)
+    padded[1:-1, 1:-1] = np.frombuffer(grid._occupied, dtype=np.uint8).reshape(height, width)
+    blocked = padded.tobytes()
+
+    def cellid(coord):
+        return coord[0] + 1 + (coord[1] + 1) * rowstep
+
+    def coordof(cell):
+        y, x = divmod(cell, rowstep)
+        return (x - 1, y - 1)
+
+    goalids = set(cellid(goal) for goal in goals)
+
+    def jump(cell, dx, dy):
+        # walk from cell in direction (dx, dy) until a jump point, a goal,
+        # or a blocked cell (None)
+        up = dy * rowstep
+        if dx != 0 and dy != 0:
+            while True:
+                cell += dx + up
+                if blocked[cell]:
+                    return None
+                if cell in goalids:
+                    return cell
+                if (blocked[cell - dx] and not blocked[cell - dx + up]) or \
+                   (blocked[cell - up] and not blocked[cell + dx - up]):
+                    return cell
+                # a diagonal step is a jump point if a straight run from it finds one
+                if jump(cell, dx, 0) is not None or jump(cell, 0, dy) is not None:
+                    return cell
+        elif dx != 0:
+            while True:
+                cell += dx
+                if blocked[cell]:
+                    return None
+                if cell in goalids:
+                    return cell
+                if (blocked[cell + rowstep] and not blocked[cell + dx + rowstep]) or \
+                   (blocked[cell - rowstep] and not blocked[cell + dx - rowstep]):
+                    return cell
+        else:
+            while True:
+                cell += up
+                if blocked[cell]:
+                    return None
+                if cell in goalids:
+                    return cell
+                if (blocked[cell + 1] and not blocked[cell + 1 + up]) or \
+                   (blocked[cell - 1] and not blocked[cell - 1 + up]):
+                    return cell
+
+    def directions(cell, parent):
+        # natural and forced neighbor directions when arriving from parent
+        if parent is None:
+            return [(i, j) for i in range(-1, 2) for j in range(-1, 2) if (i, j) != (0, 0)]
+        x, y = coordof(cell)
+        px, py = coordof(parent)
+        dx = (x > px) - (x < px)
+        dy = (y > py) - (y < py)
+        up = dy * rowstep
+        if dx != 0 and dy != 0:
+            result = [(dx, 0), (0, dy), (dx, dy)]
+            if blocked[cell - dx]:
+                result.append((-dx, dy))
+            if blocked[cell - up]:
+                result.append((dx, -dy))
+        elif dx != 0:
+            result = [(dx, 0)]
+            if blocked[cell + rowstep]:
+                result.append((dx, 1))
+            if blocked[cell - rowstep]:
+                result.append((dx, -1))
+        else:
+            result = [(0, dy)]
+            if blocked[cell + 1]:
+                result.append((1, dy))
+            if blocked[cell - 1]:
+                result.append((-1, dy))
+        return result
+
+    startid = cellid(start)
+    costs = {startid: 0}
+    parents = {startid: None}
+    evaluated = set()
+    openheap = [(min(heuristic(start, goal) for goal in goals), 0, startid)]
+    pushed = 1
+
+    while openheap:
+        _, _, cell = heapq.heappop(openheap)
+        if cell in evaluated:
+            continue
+        if cell in goalids:
+            jumppoints = []
+            while cell is not None:
+                jumppoints.append(coordof(cell))
+                cell = parents[cell]
+            jumppoints.reverse()
+            grid.setPath(expand_path(jumppoints))
+            return
+
+        evaluated.add(cell)
+        coord = coordof(cell)
+        grid.addVisited(coord)
+
+        for dx, dy in directions(cell, parents[cell]):
+            ncell = jump(cell, dx, dy)
+            if ncell is None or ncell in evaluated:
+                continue
+            ncoord = coordof(ncell)
+            calc_cost = costs[cell] + octile_distance(coord, ncoord)
+            if calc_cost >= costs.get(ncell, float('inf')):
                 continue
-                
-            node.parentNode = currentNode
-            node.g = calc_cost
-            node.h = heuristic(ncoord,goal)
+            costs[ncell] = calc_cost
+            parents[ncell] = cell
+            h = min(heuristic(ncoord, goal) for goal in goals)
+            heapq.heappush(openheap, (calc_cost + h, pushed, ncell))
+            pushed += 1
+
+
+def free_neighbor_moves(grid):
+    """Moves out of every cell that stay on the grid and off obstacles,
+        the flat array counterpart of getNeighbors for the planners' inner loops
+
+        Arguments:
+        grid -- CozGrid instance
+
+        Returns (masks, moves). masks is indexed by cell id x + y * width and
+        moves[masks[cellid]] is the tuple of (dx, dy, cell id step, weight)
+        moves out of that cell, in getNeighbors order
+    """
+    width = grid.width
+    height = grid.height
+    offsets = [(i, j) for i in (-1, 0, 1) for j in (-1, 0, 1) if (i, j) != (0, 0)]
+
+    # One bit per offset, set where the neighbor is free. The border of the
+    # padded map counts as occupied
+    free = np.zeros((height + 2, width + 2), dtype=bool)
+    free[1:-1, 1:-1] = np.frombuffer(grid._occupied, dtype=np.uint8).reshape(height, width) == 0
+    masks = np.zeros((height, width), dtype=np.uint8)
+    for bit, (i, j) in enumerate(offsets):
+        masks |= free[1 + j:height + 1 + j, 1 + i:width + 1 + i].astype(np.uint8) << bit
+
+    moves = [tuple((i, j, i + j * width, math.sqrt(i * i + j * j))
+                   for bit, (i, j) in enumerate(offsets) if mask >> bit & 1)
+             for mask in range(256)]
+    return masks.tobytes(), moves
+
+
+def octile_distance(a, b):
+    """Cost of the cheapest 8-connected move sequence between two cells on an open grid
+    """
+    dx = abs(a[0] - b[0])
+    dy = abs(a[1] - b[1])
+    return max(dx, dy) - min(dx, dy) + math.sqrt(2) * min(dx, dy)
+
+
+def expand_path(points):
+    """Expand a path of cells joined by straight or diagonal runs into
+        adjacent-cell steps
+
+        Arguments:
+        points -- list of cells, consecutive cells on one row, column or diagonal
+
+        Returns list of coordinates
+    """
+    if not points:
+        return []
+    path = [points[0]]
+    for point in points[1:]:
+        x, y = path[-1]
+        dx = (point[0] > x) - (point[0] < x)
+        dy = (point[1] > y) - (point[1] < y)
+        while (x, y) != point:
+            x += dx
+            y += dy
+            path.append((x, y))
+    return path
+
+
+class DStarLite:
+    """Incremental planner (D* Lite) that keeps its search between calls
+
+        The search runs backward from the goal, so when the start moves or a
+        few obstacles are added or removed only the part of the search those
+        cells affect is repaired. Like astar it plans to the nearest of the
+        grid's goals. Use it like astar but keep the instance: call plan()
+        after every setStart/addObstacle/addGoal
+
+        Arguments:
+        grid -- CozGrid instance to perform search on
+        heuristic -- supplied heuristic function
+    """
+
+    def __init__(self, grid, heuristic):
+        self.grid = grid
+        self.heuristic = heuristic
+        self.goals = None
+
+    def reset(self):
+        """Throw away the search state, the next plan() starts from scratch
+        """
+        grid = self.grid
+        self.goals = set(grid.getGoals())
+        self.last = grid.getStart()
+        self.obstacles = set(grid.getObstacles())
+        self.km = 0
+        # g and rhs values indexed by cell id x + y * width
+        size = grid.width * grid.height
+        self.g = [float('inf')] * size
+        self.rhs = [float('inf')] * size
+        # open set as a binary heap with lazy deletion, queued[cell] is the
+        # key of the cell's current entry or None if it is not queued
+        self.queued = [None] * size
+        self.openheap = []
+        # every goal is a source of the backward search
+        for goal in self.goals:
+            goalid = self._id(goal)
+            self.rhs[goalid] = 0
+            self._push(goalid, self._key(goalid))
+
+    def _id(self, coord):
+        return coord[0] + coord[1] * self.grid.width
+
+    def _coord(self, cellid):
+        return (cellid % self.grid.width, cellid // self.grid.width)
+
+    def _key(self, cellid):
+        # rounded like the f values in astar, otherwise sums of diagonal
+        # weights that should be equal can compare the wrong way and end the
+        # search while cells between the start and the goal are inconsistent
+        best = min(self.g[cellid], self.rhs[cellid])
+        return (round(best + self.heuristic(self._coord(cellid), self.start) + self.km, 9), round(best, 9))
+
+    def _push(self, cellid, key):
+        self.queued[cellid] = key
+        heapq.heappush(self.openheap, (key, cellid))
+
+    def _topKey(self):
+        # drop stale entries left behind by lazy deletion
+        while self.openheap and self.queued[self.openheap[0][1]] != self.openheap[0][0]:
+            heapq.heappop(self.openheap)
+        if self.openheap:
+            return self.openheap[0][0]
+        return (float('inf'), float('inf'))
+
+    def _updateVertex(self, cellid):
+        coord = self._coord(cellid)
+        if coord not in self.goals:
+            best = float('inf')
+            if not self.grid.isObstacle(coord):
+                for ncoord, weight in self.grid.getNeighbors(coord):
+                    cost = weight + self.g[self._id(ncoord)]
+                    if cost < best:
+                        best = cost
+            self.rhs[cellid] = best
+        self.queued[cellid] = None
+        if self.g[cellid] != self.rhs[cellid]:
+            self._push(cellid, self._key(cellid))
+
+    def _computeShortestPath(self):
+        startid = self._id(self.start)
+        while self._topKey() < self._key(startid) or self.rhs[startid] != self.g[startid]:
+            oldkey, cellid = heapq.heappop(self.openheap)
+            self.queued[cellid] = None
+            newkey = self._key(cellid)
+            if oldkey < newkey:
+                self._push(cellid, newkey)
+                continue
+            coord = self._coord(cellid)
+            self.grid.addVisited(coord)
+            if self.g[cellid] > self.rhs[cellid]:
+                self.g[cellid] = self.rhs[cellid]
+            else:
+                self.g[cellid] = float('inf')
+                self._updateVertex(cellid)
+            for ncoord, _ in self.grid.getNeighbors(coord):
+                self._updateVertex(self._id(ncoord))
+
+    def plan(self):
+        """Bring the search up to date with the grid and set the grid's path
+            Clears the grid's visited cells and marks only the cells expanded
+            by this call, clears the path if the goal cannot be reached
+        """
+        grid = self.grid
+        self.start = grid.getStart()
+        if self.goals != set(grid.getGoals()):
+            self.reset()
+
+        # the heuristic is measured from the start, so when the start moves
+        # all queued keys are off by at most the distance it moved
+        self.km += self.heuristic(self.last, self.start)
+        self.last = self.start
+
+        # cells whose obstacle status changed and the cells around them
+        current = grid.getObstacles()
+        changed = (current - self.obstacles) | (self.obstacles - current)
+        self.obstacles = set(current)
+        for coord in changed:
+            if grid.coordInBounds(coord):
+                self._updateVertex(self._id(coord))
+                for ncoord, _ in grid.getNeighbors(coord):
+                    self._updateVertex(self._id(ncoord))
+
+        grid.clearVisited()
+        self._computeShortestPath()
+        path = self._extractPath()
+        if path is None:
+            # the repaired search is inconsistent, plan again from scratch
+            self.reset()
+            self._computeShortestPath()
+            path = self._extractPath()
+        if path:
+            grid.setPath(path)
+        else:
+            grid.clearPath()
+
+    def _extractPath(self):
+        """Follow the cheapest neighbors from the start down to a goal
+
+            Returns the path, [] if the goal cannot be reached and None if g
+            does not strictly decrease along the way, which would otherwise
+            make the walk cycle
+        """
+        coord = self.start
+        g = self.g[self._id(coord)]
+        if g == float('inf'):
+            return []
+        path = [coord]
+        while coord not in self.goals:
+            coord = min(self.grid.getNeighbors(coord), key=lambda n: n[1] + self.g[self._id(n[0])])[0]
+            ng = self.g[self._id(coord)]
+            if not ng < g:
+                return None
+            g = ng
+            path.append(coord)
+        return path
 
 
 def heuristic(current, goal):
@@ -96,6 +479,383 @@ def heuristic(current, goal):
     #return abs(current[0]-goal[0])+abs(current[1]-goal[1])
     return math.sqrt((current[0]-goal[0])**2+(current[1]-goal[1])**2)
 
+# Kept under another name for astar, whose parameter hides this one
+_euclidean = heuristic
+
+
+def dstarlite(grid, heuristic):
+    """Plan once with a fresh DStarLite, for use where a planner function is expected
+
+        Arguments:
+        grid -- CozGrid instance to perform search on
+        heuristic -- supplied heuristic function
+    """
+    DStarLite(grid, heuristic).plan()
+
+
+def cost_field(grid, source):
+    """Exact cost from every cell to source, by a Dijkstra search out of source
+
+        Arguments:
+        grid -- CozGrid instance
+        source -- grid coordinates of the cell to measure from
+
+        Returns list of costs indexed by cell id x + y * width, inf for
+        cells that cannot reach source
+    """
+    width = grid.width
+    costs = [float('inf')] * (grid.width * grid.height)
+    costs[source[0] + source[1] * width] = 0.0
+    openheap = [(0.0, source)]
+    while openheap:
+        cost, coord = heapq.heappop(openheap)
+        if cost > costs[coord[0] + coord[1] * width]:
+            continue
+        for ncoord, weight in grid.getNeighbors(coord):
+            nid = ncoord[0] + ncoord[1] * width
+            if cost + weight < costs[nid]:
+                costs[nid] = cost + weight
+                heapq.heappush(openheap, (cost + weight, ncoord))
+    return costs
+
+
+class DistanceFieldHeuristic:
+    """Exact cost-to-goal heuristic for one grid
+
+        The first query for a goal runs a reverse Dijkstra from it and keeps
+        the resulting cost field, so every later query for that goal is a
+        table lookup and A* walks almost straight along the optimal path.
+        The fields are dropped when the grid's obstacles change.
+        Use it in place of heuristic: astar(grid, DistanceFieldHeuristic(grid))
+
+        Arguments:
+        grid -- CozGrid instance the heuristic is used on
+    """
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.version = None
+        self.fields = {}
+
+    def __call__(self, current, goal):
+        if self.version != self.grid.getObstacleVersion():
+            self.version = self.grid.getObstacleVersion()
+            self.fields = {}
+        field = self.fields.get(goal)
+        if field is None:
+            field = cost_field(self.grid, goal)
+            self.fields[goal] = field
+        return field[current[0] + current[1] * self.grid.width]
+
+
+class LandmarkHeuristic:
+    """ALT (A*, landmarks, triangle inequality) heuristic for one grid
+
+        Cost fields from a few landmark cells spread over the map are
+        computed once, then for any pair of cells the largest
+        |d(landmark, goal) - d(landmark, current)| is a lower bound on their
+        distance. Unlike DistanceFieldHeuristic nothing is computed per goal,
+        so it suits maps whose goals change. The fields are recomputed when
+        the grid's obstacles change
+
+        Arguments:
+        grid -- CozGrid instance the heuristic is used on
+        count -- number of landmarks
+    """
+
+    def __init__(self, grid, count=4):
+        self.grid = grid
+        self.count = count
+        self.version = None
+        self.fields = []
+
+    def selectLandmarks(self):
+        """Pick landmarks by farthest point sampling, starting from the free
+            cell farthest from the grid's start
+        """
+        grid = self.grid
+        self.fields = []
+        seed = grid.getStart()
+        if seed is None or not grid.coordInBounds(seed) or grid.isObstacle(seed):
+            return
+        nearest = cost_field(grid, seed)
+        for _ in range(self.count):
+            reachable = [(cost, cellid) for cellid, cost in enumerate(nearest) if cost != float('inf')]
+            cost, cellid = max(reachable)
+            if cost == 0 and self.fields:
+                break
+            field = cost_field(grid, (cellid % grid.width, cellid // grid.width))
+            self.fields.append(field)
+            nearest = [min(a, b) for a, b in zip(nearest, field)]
+
+    def __call__(self, current, goal):
+        if self.version != self.grid.getObstacleVersion():
+            self.version = self.grid.getObstacleVersion()
+            self.selectLandmarks()
+        width = self.grid.width
+        currentid = current[0] + current[1] * width
+        goalid = goal[0] + goal[1] * width
+        best = 0.0
+        for field in self.fields:
+            a = field[currentid]
+            b = field[goalid]
+            if a == float('inf') and b == float('inf'):
+                continue
+            if a == float('inf') or b == float('inf'):
+                # only one of them is connected to this landmark
+                return float('inf')
+            if abs(a - b) > best:
+                best = abs(a - b)
+        return best
+
+
+class SearchTree:
+    """Shortest path tree out of one root cell, grown only as far as queries need
+
+        A Dijkstra search from root that stops as soon as the queried cells
+        are settled and picks up where it stopped on the next query, so any
+        number of goals can be answered from one search. Grid edges are
+        symmetric, so the tree also answers paths into root by reversing them
+
+        Arguments:
+        grid -- CozGrid instance to search on
+        root -- grid coordinates of the cell the tree grows from
+    """
+
+    def __init__(self, grid, root):
+        self.grid = grid
+        self.root = root
+        self.version = grid.getObstacleVersion()
+        size = grid.width * grid.height
+        self.costs = [float('inf')] * size
+        self.parents = [-1] * size
+        self.settled = bytearray(size)
+        rootid = root[0] + root[1] * grid.width
+        self.costs[rootid] = 0.0
+        self.openheap = [(0.0, rootid)]
+
+    def grow(self, targets, first=False):
+        """Expand the search until every target cell is settled, or only the
+            nearest one if first is set, or until nothing is left to expand
+
+            Returns the coordinates of the first target settled, None if
+            none of them can be reached
+        """
+        grid = self.grid
+        width = grid.width
+        pending = set(coord[0] + coord[1] * width for coord in targets if grid.coordInBounds(coord))
+        settled = [cellid for cellid in pending if self.settled[cellid]]
+        if first and settled:
+            # cells are settled in cost order, so no unsettled target is
+            # nearer than the nearest settled one
+            cellid = min(settled, key=self.costs.__getitem__)
+            return (cellid % width, cellid // width)
+        pending.difference_update(settled)
+        found = None
+        while pending and self.openheap:
+            cost, cellid = heapq.heappop(self.openheap)
+            if self.settled[cellid]:
+                continue
+            self.settled[cellid] = 1
+            for ncoord, weight in grid.getNeighbors((cellid % width, cellid // width)):
+                nid = ncoord[0] + ncoord[1] * width
+                if cost + weight < self.costs[nid]:
+                    self.costs[nid] = cost + weight
+                    self.parents[nid] = cellid
+                    heapq.heappush(self.openheap, (cost + weight, nid))
+            if cellid in pending:
+                pending.discard(cellid)
+                if found is None:
+                    found = (cellid % width, cellid // width)
+                if first:
+                    break
+        return found
+
+    def cost(self, coord):
+        """Cost of the shortest path between root and coord, inf if there is none
+        """
+        self.grow([coord])
+        if not self.grid.coordInBounds(coord):
+            return float('inf')
+        return self.costs[coord[0] + coord[1] * self.grid.width]
+
+    def pathTo(self, coord):
+        """Shortest path from root to coord as a list of cells, [] if there is none
+        """
+        if self.cost(coord) == float('inf'):
+            return []
+        width = self.grid.width
+        cellid = coord[0] + coord[1] * width
+        path = []
+        while cellid != -1:
+            path.append((cellid % width, cellid // width))
+            cellid = self.parents[cellid]
+        path.reverse()
+        return path
+
+    def pathFrom(self, coord):
+        """Shortest path from coord to root, [] if there is none
+        """
+        path = self.pathTo(coord)
+        path.reverse()
+        return path
+
+
+class MultiQueryPlanner:
+    """Answers many start/goal queries over one grid by sharing search trees
+
+        One SearchTree is kept per cell that queries start or end at, so
+        queries with a common endpoint cost one partial search between them
+        instead of one full search each. All trees are dropped when the
+        grid's obstacles change
+
+        Arguments:
+        grid -- CozGrid instance to plan on
+    """
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.version = None
+        self.trees = {}
+
+    def tree(self, root):
+        """The search tree grown from root, created on first use
+        """
+        if self.version != self.grid.getObstacleVersion():
+            self.version = self.grid.getObstacleVersion()
+            self.trees = {}
+        tree = self.trees.get(root)
+        if tree is None:
+            tree = SearchTree(self.grid, root)
+            self.trees[root] = tree
+        return tree
+
+    def nearest(self, start, goals):
+        """Nearest of several goals from start, with one search for all of them
+
+            Returns (goal, path), (None, []) if no goal can be reached
+        """
+        tree = self.tree(start)
+        goal = tree.grow(goals, first=True)
+        if goal is None or tree.cost(goal) == float('inf'):
+            return None, []
+        return goal, tree.pathTo(goal)
+
+    def distances(self, points):
+        """All-pairs shortest path costs between points
+
+            Costs are symmetric, so the tree of each point only has to reach
+            the points after it in the list
+
+            Returns dictionary mapping (a, b) to the cost from a to b
+        """
+        table = {}
+        for i, a in enumerate(points):
+            table[(a, a)] = 0.0
+            rest = points[i + 1:]
+            if not rest:
+                continue
+            tree = self.tree(a)
+            tree.grow(rest)
+            for b in rest:
+                table[(a, b)] = table[(b, a)] = tree.cost(b)
+        return table
+
+    def query(self, queries):
+        """Shortest paths for a batch of (start, goal) pairs
+
+            Each query is answered from the tree of whichever endpoint is
+            shared by more queries in the batch, growing that tree once to
+            cover all the cells asked of it
+
+            Returns list of paths in the order of queries, [] where the goal
+            cannot be reached
+        """
+        counts = {}
+        for start, goal in queries:
+            counts[start] = counts.get(start, 0) + 1
+            counts[goal] = counts.get(goal, 0) + 1
+        roots = []
+        targets = {}
+        for start, goal in queries:
+            if start in self.trees or counts[start] >= counts[goal] and goal not in self.trees:
+                root, other = start, goal
+            else:
+                root, other = goal, start
+            roots.append(root)
+            targets.setdefault(root, []).append(other)
+        for root, others in targets.items():
+            self.tree(root).grow(others)
+        paths = []
+        for (start, goal), root in zip(queries, roots):
+            if root == start:
+                paths.append(self.tree(root).pathTo(goal))
+            else:
+                paths.append(self.tree(root).pathFrom(start))
+        return paths
+
+    def tour(self, start, goals, exact=7):
+        """Cheapest order to visit all goals from start, and the path through them
+
+            The costs between start and the goals come from one tree per
+            point, after which orders are compared by table lookups. Every
+            order is tried for up to exact goals, beyond that the nearest
+            unvisited goal is taken next
+
+            Returns (order of goals, path), ([], []) if a goal cannot be reached
+        """
+        goals = list(dict.fromkeys(goals))
+        points = [start] + goals
+        table = self.distances(points)
+        if len(goals) <= exact:
+            order = min(itertools.permutations(goals),
+                        key=lambda order: sum(table[leg] for leg in zip((start,) + order, order)))
+        else:
+            order = []
+            current = start
+            left = set(goals)
+            while left:
+                current = min(left, key=lambda goal: table[(current, goal)])
+                order.append(current)
+                left.discard(current)
+        order = list(order)
+        if any(table[leg] == float('inf') for leg in zip([start] + order, order)):
+            return [], []
+        path = [start]
+        for a, b in zip([start] + order, order):
+            path.extend(self.tree(a).pathTo(b)[1:])
+        return order, path
+
+
+def plan_tour(grid, heuristic=None):
+    """Set the grid's path to the cheapest tour from the start through every goal
+
+        Arguments:
+        grid -- CozGrid instance to perform search on
+        heuristic -- unused, accepted so it can be called like the other planners
+    """
+    _, path = MultiQueryPlanner(grid).tour(grid.getStart(), grid.getGoals())
+    if path:
+        grid.setPath(path)
+    else:
+        grid.clearPath()
+
+
+# Heuristics that can be selected by name, each entry builds the heuristic for a grid
+HEURISTICS = {
+    'euclidean': lambda grid: heuristic,
+    'distancefield': DistanceFieldHeuristic,
+    'landmarks': LandmarkHeuristic,
+}
+
+
+# Planners that can be selected by name, all take (grid, heuristic) and set the grid's path
+PLANNERS = {
+    'astar': astar,
+    'jps': jps,
+    'dstarlite': dstarlite,
+}
+
 
 def cell_to_pose(cell,scale,angle=None):
         if angle is not None:
@@ -173,7 +933,8 @@ def cozmoBehavior(robot: cozmo.robot.Robot):
         grid.addObstacle(block)
         finish = get_finish_from_pose(cube.pose,scale)
         grid.addGoal(finish)
-        astar(grid,heuristic)
+        planner = DStarLite(grid,heuristic)
+        planner.plan()
         
         
         newpath = True
@@ -196,9 +957,8 @@ def cozmoBehavior(robot: cozmo.robot.Robot):
                     robot.say_text("I found a new cube").wait_for_completed()
                     grid.setStart(path[i])
                     grid.addObstacle(pose_to_cell(newcube.pose,scale))
-                    grid.clearPath()
-                    grid.clearVisited()
-                    astar(grid,heuristic)
+                    # only repair the part of the search the new cube changes
+                    planner.plan()
                     newpath = True
                     break
             
@@ -208,12 +968,6 @@ def cozmoBehavior(robot: cozmo.robot.Robot):
         break
         stopevent.set()        
         
-class Node:
-    def __init__(self, coord,h=0,g=0):
-        self.coord = coord
-        self.h = h
-        self.g = g
-        self.parentNode = None
 ######################## DO NOT MODIFY CODE BELOW THIS LINE ####################################
 
 
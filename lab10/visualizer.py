@@ -1,19 +1,25 @@
 from tkinter import *
 from grid import *
 import threading
+import time
 
 class Visualizer():
     """Visualizer to display status of an associated CozGrid instance, supplied on instantiation
 
         Should be started in main thread to avoid issue of GUI code not working
         in spawned threads on OSX
+
+        Redraws happen at most maxfps times a second, grid changes made in
+        between are drawn together. Visited cells are painted into a single
+        image below everything else instead of one canvas item per cell
     """
         
 
-    def __init__(self, grid, scale=25):
+    def __init__(self, grid, scale=25, maxfps=20):
         self.grid = grid
         self.running = threading.Event()
         self.scale = scale
+        self.maxfps = maxfps
 
 
     def drawgrid(self):
@@ -60,14 +66,27 @@ class Visualizer():
             self.colorsquare(goal, '#0000DD', tags='goal')
 
 
+    def colorvisited(self, location, color='#CCCCCC'):
+        """Paint a cell in the visited image layer
+
+            Arguments:
+            location -- coordinates of cell
+            color -- desired color, hexadecimal string (e.g.: '#C0FFEE')
+        """
+        x0 = location[0]*self.scale
+        y0 = (self.grid.height - 1 - location[1])*self.scale
+        self.visitedimage.put(color, to=(x0 + 1, y0 + 1, x0 + self.scale, y0 + self.scale))
+
+
     def drawallvisited(self):
         """Redraw all visited cells
             Color is light gray by default
         """
         
-        self.canvas.delete('visited')
+        self.visitedimage.blank()
         for loc in self.grid._visited:
-            self.colorsquare(loc, '#CCCCCC', bg = True, tags='visited')
+            self.colorvisited(loc)
+        self.grid._newvisited = []
 
 
     def drawnewvisited(self):
@@ -77,7 +96,7 @@ class Visualizer():
         """
         
         for loc in self.grid._newvisited:
-            self.colorsquare(loc, '#CCCCCC', bg = True, tags='visited')
+            self.colorvisited(loc)
         self.grid._newvisited = []
 
 
@@ -137,6 +156,8 @@ class Visualizer():
             self.drawobstacles()
 
         self.grid.changes = []
+        # keep the visited layer below obstacles and grid lines
+        self.canvas.tag_lower('visited')
         self.grid.lock.release()
 
 
@@ -146,11 +167,14 @@ class Visualizer():
         
         self.grid.lock.acquire()
         
+        self.visitedimage = PhotoImage(width = self.grid.width * self.scale, height = self.grid.height * self.scale)
+        self.canvas.create_image(0, 0, image = self.visitedimage, anchor = NW, tags='visited')
         self.drawgrid()
         self.drawgoals()
         self.drawstart()
         self.drawobstacles()
         
+        self.canvas.tag_lower('visited')
         self.grid.lock.release()
             
 
@@ -183,6 +207,8 @@ class Visualizer():
 
 class UpdateThread(threading.Thread):
     """Thread to update a visualizer instance whenever its associated CozGrid instance is modified
+        Waits a frame (1 / visualizer.maxfps seconds) after each update so
+        changes coming in faster than that are drawn together
 
         Arguments:
         visualizer -- visualizer to monitor
@@ -197,3 +223,4 @@ class UpdateThread(threading.Thread):
             self.visualizer.grid.updated.wait()
             if self.visualizer.running.is_set():
                 self.visualizer.trig_update()
+                time.sleep(1.0 / self.visualizer.maxfps)
@@ -15,6 +15,8 @@
 "Feature extractors for Pacman game states"
 
 from game import Directions, Actions
+from collections import deque
+import numpy as np
 import util
 
 class FeatureExtractor:
@@ -26,6 +28,14 @@ class FeatureExtractor:
         """
         util.raiseNotDefined()
 
+    def getFeaturesForActions(self, state, actions):
+        """
+          Returns a dict from each of actions to the features
+          getFeatures returns for it. Extractors that can share
+          work between the actions of a state override this.
+        """
+        return dict((action, self.getFeatures(state, action)) for action in actions)
+
 class IdentityExtractor(FeatureExtractor):
     def getFeatures(self, state, action):
         feats = util.Counter()
@@ -41,15 +51,130 @@ class CoordinateExtractor(FeatureExtractor):
         feats['action=%s' % action] = 1.0
         return feats
 
+class MazeDistances:
+    """
+    Maze distances between the free cells of one walls grid
+
+    The distances from a cell are found by one BFS the first time they
+    are needed and kept, so distances between any two cells become
+    table lookups. closestFood keeps the distance from every cell to
+    its nearest food, found by one BFS from all the food, and when food
+    is eaten only the cells whose nearest food that was are updated.
+
+    Use getMazeDistances(walls) to share one instance per layout.
+    """
+    def __init__(self, walls):
+        self.walls = walls
+        self.cells = [(x, y) for x in range(walls.width) for y in range(walls.height) if not walls[x][y]]
+        self.index = dict((cell, i) for i, cell in enumerate(self.cells))
+        self.neighbors = [[self.index[n] for n in Actions.getLegalNeighbors(cell, walls) if n != cell]
+                          for cell in self.cells]
+        self.rows = {}
+        # state of the nearest food distances, see closestFood
+        self.foodBits = None
+        self.foods = set()
+        self.foodField = None
+
+    def distancesFrom(self, i):
+        """
+        Array of the maze distances from the cell with index i to every
+        cell, len(self.cells) for cells that cannot be reached
+        """
+        row = self.rows.get(i)
+        if row is None:
+            row = self._multiSourceDistances([i])
+            self.rows[i] = row
+        return row
+
+    def getDistance(self, a, b):
+        """
+        Maze distance between cells a and b, None if there is no path
+        """
+        dist = self.distancesFrom(self.index[a])[self.index[b]]
+        if dist == len(self.cells):
+            return None
+        return int(dist)
+
+    def closestFood(self, pos, food):
+        """
+        Maze distance from pos to the nearest food in the food grid,
+        None if no food can be reached
+        """
+        if food.bits != self.foodBits:
+            self._updateFoodField(food)
+        dist = self.foodField[self.index[pos]]
+        if dist == len(self.cells):
+            return None
+        return int(dist)
+
+    def _updateFoodField(self, food):
+        # only runs when the food changes, successor states share the food
+        # grid's bits until food is eaten
+        self.foodBits = food.bits
+        cells = self.cells
+        remaining = set(f for f in self.foods if food[cells[f][0]][cells[f][1]])
+        if self.foodField is None or len(remaining) != food.count():
+            # food was added, find the distances to all of it again
+            self.foods = set(self.index[cell] for cell in food.asList())
+            self.foodField = self._multiSourceDistances(self.foods)
+            return
+        eaten = self.foods - remaining
+        self.foods = remaining
+        foodArray = np.array(sorted(remaining), dtype=np.intp)
+        for f in eaten:
+            # distances only grow, and only at cells whose nearest food was f
+            for c in np.flatnonzero(self.distancesFrom(f) == self.foodField):
+                if len(foodArray):
+                    self.foodField[c] = self.distancesFrom(c)[foodArray].min()
+                else:
+                    self.foodField[c] = len(cells)
+
+    def _multiSourceDistances(self, sources):
+        # one BFS from all of sources at once
+        field = np.full(len(self.cells), len(self.cells), dtype=np.int32)
+        for i in sources:
+            field[i] = 0
+        fringe = deque(sources)
+        while fringe:
+            current = fringe.popleft()
+            dist = field[current] + 1
+            for n in self.neighbors[current]:
+                if field[n] > dist:
+                    field[n] = dist
+                    fringe.append(n)
+        return field
+
+_mazeDistances = []
+
+def getMazeDistances(walls):
+    """
+    The MazeDistances of walls, shared by every walls grid equal to it.
+    Game states carry copies of the layout, so grids are compared rather
+    than only checked for identity.
+    """
+    for known in _mazeDistances:
+        if known.walls is walls:
+            return known
+    for known in _mazeDistances:
+        if known.walls == walls:
+            return known
+    known = MazeDistances(walls)
+    _mazeDistances.append(known)
+    return known
+
 def closestFood(pos, food, walls):
     """
     closestFood -- this is similar to the function that we have
     worked on in the search project; here its all in one place
     """
-    fringe = [(pos[0], pos[1], 0)]
+    distances = getMazeDistances(walls)
+    if pos in distances.index:
+        return distances.closestFood(pos, food)
+    # pos is in a wall, search from it directly
+    fringe = deque([(pos[0], pos[1], 0)])
     expanded = set()
     while fringe:
-        pos_x, pos_y, dist = fringe.pop(0)
+        pos_x, pos_y, dist = fringe.popleft()
         if (pos_x, pos_y) in expanded:
             continue
         expanded.add((pos_x, pos_y))
@@ -73,31 +198,43 @@ class SimpleExtractor(FeatureExtractor):
     """
 
     def getFeatures(self, state, action):
+        return self.getFeaturesForActions(state, [action])[action]
+
+    def getFeaturesForActions(self, state, actions):
         # extract the grid of food and wall locations and get the ghost locations
         food = state.getFood()
         walls = state.getWalls()
         ghosts = state.getGhostPositions()
 
-        features = util.Counter()
-
-        features["bias"] = 1.0
+        # count for every cell the number of ghosts 1-step away from it
+        ghostNeighbors = util.Counter()
+        for g in ghosts:
+            for cell in Actions.getLegalNeighbors(g, walls):
+                ghostNeighbors[cell] += 1
 
-        # compute the location of pacman after he takes the action
         x, y = state.getPacmanPosition()
-        dx, dy = Actions.directionToVector(action)
-        next_x, next_y = int(x + dx), int(y + dy)
-
-        # count the number of ghosts 1-step away
-        features["#-of-ghosts-1-step-away"] = sum((next_x, next_y) in Actions.getLegalNeighbors(g, walls) for g in ghosts)
-
-        # if there is no danger of ghosts then add the food feature
-        if not features["#-of-ghosts-1-step-away"] and food[next_x][next_y]:
-            features["eats-food"] = 1.0
-
-        dist = closestFood((next_x, next_y), food, walls)
-        if dist is not None:
-            # make the distance a number less than one otherwise the update
-            # will diverge wildly
-            features["closest-food"] = float(dist) / (walls.width * walls.height)
-        features.divideAll(10.0)
-        return features
+        featuresByAction = {}
+        for action in actions:
+            features = util.Counter()
+
+            features["bias"] = 1.0
+
+            # compute the location of pacman after he takes the action
+            dx, dy = Actions.directionToVector(action)
+            next_x, next_y = int(x + dx), int(y + dy)
+
+            # count the number of ghosts 1-step away
+            features["#-of-ghosts-1-step-away"] = ghostNeighbors[(next_x, next_y)]
+
+            # if there is no danger of ghosts then add the food feature
+            if not features["#-of-ghosts-1-step-away"] and food[next_x][next_y]:
+                features["eats-food"] = 1.0
+
+            dist = closestFood((next_x, next_y), food, walls)
+            if dist is not None:
+                # make the distance a number less than one otherwise the update
+                # will diverge wildly
+                features["closest-food"] = float(dist) / (walls.width * walls.height)
+            features.divideAll(10.0)
+            featuresByAction[action] = features
+        return featuresByAction
@@ -161,9 +161,14 @@ class AgentState:
 
 class Grid:
     """
-    A 2-dimensional array of objects backed by a list of lists.  Data is accessed
-    via grid[x][y] where (x,y) are positions on a Pacman map with x horizontal,
-    y vertical and the origin (0,0) in the bottom left corner.
+    A 2-dimensional array of booleans.  Data is accessed via grid[x][y] where
+    (x,y) are positions on a Pacman map with x horizontal, y vertical and the
+    origin (0,0) in the bottom left corner.
+
+    The cells are the bits of a single int, cell (x,y) is bit x * height + y.
+    Ints are immutable, so copies share the bits until one of them is written
+    and the hash is cached until the grid changes.  grid[x] is a GridColumn,
+    built from the bits the first time column x is used.
 
     The __str__ method constructs an output that is oriented like a pacman board.
     """
@@ -173,57 +178,86 @@ class Grid:
 
         self.width = width
         self.height = height
-        self.data = [[initialValue for y in range(height)] for x in range(width)]
+        self.bits = (1 << (width * height)) - 1 if initialValue else 0
+        self._hash = None
+        self._columns = [None] * width
         if bitRepresentation:
             self._unpackBits(bitRepresentation)
 
     def __getitem__(self, i):
-        return self.data[i]
+        column = self._columns[i]
+        if column is None:
+            column = self._columns[i] = GridColumn(self, i % self.width)
+        return column
 
     def __setitem__(self, key, item):
-        self.data[key] = item
+        column = self[key]
+        for y, value in enumerate(item):
+            column[y] = value
+
+    def _set(self, index, value):
+        if value:
+            bits = self.bits | (1 << index)
+        else:
+            bits = self.bits & ~(1 << index)
+        if bits != self.bits:
+            self.bits = bits
+            self._hash = None
+
+    def __getstate__(self):
+        # columns point back at the grid and are rebuilt on demand
+        state = self.__dict__.copy()
+        state['_columns'] = [None] * self.width
+        return state
+
+    @property
+    def data(self):
+        """
+        The columns as a list, for code that used the old list of lists
+        """
+        return [self[x] for x in range(self.width)]
 
     def __str__(self):
-        out = [[str(self.data[x][y])[0] for x in range(self.width)] for y in range(self.height)]
+        out = [['T' if self.bits >> (x * self.height + y) & 1 else 'F' for x in range(self.width)] for y in range(self.height)]
         out.reverse()
         return '\n'.join([''.join(x) for x in out])
 
     def __eq__(self, other):
-        if other == None: return False
-        return self.data == other.data
+        if not isinstance(other, Grid): return False
+        return self.width == other.width and self.height == other.height and self.bits == other.bits
 
     def __hash__(self):
-        # return hash(str(self))
-        base = 1
-        h = 0
-        for l in self.data:
-            for i in l:
-                if i:
-                    h += base
-                base *= 2
-        return hash(h)
+        # same value as hashing the int the cells spell out, computed once
+        if self._hash is None:
+            self._hash = hash(self.bits)
+        return self._hash
 
     def copy(self):
         g = Grid(self.width, self.height)
-        g.data = [x[:] for x in self.data]
+        g.bits = self.bits
+        g._hash = self._hash
         return g
 
     def deepCopy(self):
         return self.copy()
 
-    def shallowCopy(self):
-        g = Grid(self.width, self.height)
-        g.data = self.data
-        return g
-
     def count(self, item =True ):
-        return sum([x.count(item) for x in self.data])
+        if item not in [False, True]: return 0
+        ones = bin(self.bits).count('1')
+        if item:
+            return ones
+        return self.width * self.height - ones
 
     def asList(self, key = True):
+        if key not in [False, True]: return []
+        bits = self.bits
+        if not key:
+            bits = ~bits & ((1 << (self.width * self.height)) - 1)
         list = []
-        for x in range(self.width):
-            for y in range(self.height):
-                if self[x][y] == key: list.append( (x,y) )
+        while bits:
+            low = bits & -bits
+            list.append(self._cellIndexToPosition(low.bit_length() - 1))
+            bits ^= low
         return list
 
     def packBits(self):
@@ -231,22 +265,18 @@ class Grid:
         Returns an efficient int list representation
 
         (width, height, bitPackedInts...)
+
+        Each int holds CELLS_PER_INT cells, the first of them in its highest bit
         """
         bits = [self.width, self.height]
-        currentInt = 0
-        for i in range(self.height * self.width):
-            bit = self.CELLS_PER_INT - (i % self.CELLS_PER_INT) - 1
-            x, y = self._cellIndexToPosition(i)
-            if self[x][y]:
-                currentInt += 2 ** bit
-            if (i + 1) % self.CELLS_PER_INT == 0:
-                bits.append(currentInt)
-                currentInt = 0
-        bits.append(currentInt)
+        size = self.CELLS_PER_INT
+        mask = (1 << size) - 1
+        for start in range(0, self.width * self.height + 1, size):
+            bits.append(self._reverseBits(self.bits >> start & mask))
         return tuple(bits)
 
     def _cellIndexToPosition(self, index):
-        x = index / self.height
+        x = index // self.height
         y = index % self.height
         return x, y
 
@@ -254,25 +284,36 @@ class Grid:
         """
         Fills in data from a bit-level representation
         """
-        cell = 0
-        for packed in bits:
-            for bit in self._unpackInt(packed, self.CELLS_PER_INT):
-                if cell == self.width * self.height: break
-                x, y = self._cellIndexToPosition(cell)
-                self[x][y] = bit
-                cell += 1
-
-    def _unpackInt(self, packed, size):
-        bools = []
-        if packed < 0: raise ValueError("must be a positive integer")
-        for i in range(size):
-            n = 2 ** (self.CELLS_PER_INT - i - 1)
-            if packed >= n:
-                bools.append(True)
-                packed -= n
-            else:
-                bools.append(False)
-        return bools
+        value = 0
+        for i, packed in enumerate(bits):
+            if packed < 0: raise ValueError("must be a positive integer")
+            value |= self._reverseBits(packed) << (i * self.CELLS_PER_INT)
+        self.bits = value & ((1 << (self.width * self.height)) - 1)
+        self._hash = None
+        self._columns = [None] * self.width
+
+    def _reverseBits(self, packed):
+        return int(format(packed, '0%db' % self.CELLS_PER_INT)[::-1], 2)
+
+class GridColumn(list):
+    """
+    Column x of a Grid.  Reads are plain list reads, assigning grid[x][y]
+    updates both the column and the bits of the grid.
+    """
+    __slots__ = ('grid', 'offset')
+
+    def __init__(self, grid, x):
+        offset = x * grid.height
+        bits = grid.bits >> offset
+        list.__init__(self, [bits >> y & 1 == 1 for y in range(grid.height)])
+        self.grid = grid
+        self.offset = offset
+
+    def __setitem__(self, y, value):
+        if value not in [False, True]: raise Exception('Grids can only contain booleans')
+        value = bool(value)
+        list.__setitem__(self, y, value)
+        self.grid._set(self.offset + y % len(self), value)
 
 def reconstituteGrid(bitRep):
     if type(bitRep) is not type((1,2)):
@@ -376,14 +417,18 @@ class GameStateData:
         """
         Generates a new data packet by copying information from its predecessor.
         """
-        if prevState != None:
-            self.food = prevState.food.shallowCopy()
-            self.capsules = prevState.capsules[:]
-            self.agentStates = self.copyAgentStates( prevState.agentStates )
+        if prevState is not None:
+            # The food grid, capsules and agent states are shared with the
+            # predecessor.  Code changing them replaces them with a copy first,
+            # agent states through mutableAgentState.
+            self.food = prevState.food
+            self.capsules = prevState.capsules
+            self.agentStates = prevState.agentStates
             self.layout = prevState.layout
             self._eaten = prevState._eaten
             self.score = prevState.score
 
+        self._ownedAgents = None
         self._foodEaten = None
         self._foodAdded = None
         self._capsuleEaten = None
@@ -395,6 +440,9 @@ class GameStateData:
     def deepCopy( self ):
         state = GameStateData( self )
         state.food = self.food.deepCopy()
+        state.capsules = self.capsules[:]
+        state.agentStates = self.copyAgentStates( self.agentStates )
+        state._ownedAgents = [True for agentState in state.agentStates]
         state.layout = self.layout.deepCopy()
         state._agentMoved = self._agentMoved
         state._foodEaten = self._foodEaten
@@ -402,6 +450,19 @@ class GameStateData:
         state._capsuleEaten = self._capsuleEaten
         return state
 
+    def mutableAgentState( self, agentIndex ):
+        """
+        Returns the state of the agent at agentIndex for changing, copied first
+        if it is shared with the state this one was generated from.
+        """
+        if self._ownedAgents is None:
+            self.agentStates = self.agentStates[:]
+            self._ownedAgents = [False for agentState in self.agentStates]
+        if not self._ownedAgents[agentIndex]:
+            self.agentStates[agentIndex] = self.agentStates[agentIndex].copy()
+            self._ownedAgents[agentIndex] = True
+        return self.agentStates[agentIndex]
+
     def copyAgentStates( self, agentStates ):
         copiedStates = []
         for agentState in agentStates:
@@ -434,7 +495,7 @@ class GameStateData:
 
     def __str__( self ):
         width, height = self.layout.width, self.layout.height
-        map = Grid(width, height)
+        map = [[' '] * height for x in range(width)]
         if type(self.food) == type((1,2)):
             self.food = reconstituteGrid(self.food)
         for x in range(width):
@@ -455,7 +516,9 @@ class GameStateData:
         for x, y in self.capsules:
             map[x][y] = 'o'
 
-        return str(map) + ("\nScore: %d\n" % self.score)
+        out = [''.join([map[x][y] for x in range(width)]) for y in range(height)]
+        out.reverse()
+        return '\n'.join(out) + ("\nScore: %d\n" % self.score)
 
     def _foodWallStr( self, hasFood, hasWall ):
         if hasFood:
@@ -18,6 +18,8 @@ import mdp
 import environment
 import util
 import optparse
+import numpy as np
+from mdp import compileMDP
 
 class Gridworld(mdp.MarkovDecisionProcess):
     """
@@ -32,6 +34,12 @@ class Gridworld(mdp.MarkovDecisionProcess):
         self.livingReward = 0.0
         self.noise = 0.2
 
+        # memoized model, the grid itself never changes after construction,
+        # the setters below drop whatever depends on the parameter they set
+        self._states = None
+        self._rewards = {}
+        self._transitions = {}
+
     def setLivingReward(self, reward):
         """
         The (negative) reward for exiting "normal" states.
@@ -41,12 +49,14 @@ class Gridworld(mdp.MarkovDecisionProcess):
         future rewards.
         """
         self.livingReward = reward
+        self._rewards = {}
 
     def setNoise(self, noise):
         """
         The probability of moving in an unintended direction.
         """
         self.noise = noise
+        self._transitions = {}
 
 
     def getPossibleActions(self, state):
@@ -68,14 +78,16 @@ class Gridworld(mdp.MarkovDecisionProcess):
         """
         Return list of all states.
         """
-        # The true terminal state.
-        states = [self.grid.terminalState]
-        for x in range(self.grid.width):
-            for y in range(self.grid.height):
-                if self.grid[x][y] != '#':
-                    state = (x,y)
-                    states.append(state)
-        return states
+        if self._states is None:
+            # The true terminal state.
+            states = [self.grid.terminalState]
+            for x in range(self.grid.width):
+                for y in range(self.grid.height):
+                    if self.grid[x][y] != '#':
+                        state = (x,y)
+                        states.append(state)
+            self._states = states
+        return list(self._states)
 
     def getReward(self, state, action, nextState):
         """
@@ -85,13 +97,20 @@ class Gridworld(mdp.MarkovDecisionProcess):
         departed (as in the R+N book examples, which more or
         less use this convention).
         """
+        try:
+            return self._rewards[state]
+        except KeyError:
+            pass
+        reward = self.livingReward
         if state == self.grid.terminalState:
-            return 0.0
-        x, y = state
-        cell = self.grid[x][y]
-        if type(cell) == int or type(cell) == float:
-            return cell
-        return self.livingReward
+            reward = 0.0
+        else:
+            x, y = state
+            cell = self.grid[x][y]
+            if type(cell) == int or type(cell) == float:
+                reward = cell
+        self._rewards[state] = reward
+        return reward
 
     def getStartState(self):
         for x in range(self.grid.width):
@@ -117,8 +136,17 @@ class Gridworld(mdp.MarkovDecisionProcess):
         representing the states reachable
         from 'state' by taking 'action' along
         with their transition probabilities.
+
+        The list is computed once per (state, action) and the same list
+        is returned on later calls, so it must not be modified.
         """
+        successors = self._transitions.get((state, action))
+        if successors is None:
+            successors = self.__computeTransitionStatesAndProbs(state, action)
+            self._transitions[(state, action)] = successors
+        return successors
 
+    def __computeTransitionStatesAndProbs(self, state, action):
         if action not in self.getPossibleActions(state):
             raise "Illegal action!"
 
@@ -214,6 +242,73 @@ class GridworldEnvironment(environment.Environment):
     def reset(self):
         self.state = self.gridWorld.getStartState()
 
+class BatchGridworldEnvironment:
+    """
+      numEnvironments independent episodes of a Gridworld stepped together.
+
+      States are indices into self.model.states, a CompiledMDP of the
+      gridworld, and an action is the position of the action in
+      getPossibleActions of the state. An episode that reaches the
+      terminal state starts over from the start state in the same step.
+    """
+    def __init__(self, gridWorld, numEnvironments, seed=None):
+        self.gridWorld = gridWorld
+        self.numEnvironments = numEnvironments
+        self.model = compileMDP(gridWorld, dense=False)
+        model = self.model
+        numStates = len(model.states)
+        numPairs = len(model.pairStates)
+
+        # the rows of a state are firstRows[state] + its actions
+        self.numActions = np.bincount(model.pairStates, minlength=numStates)
+        self.firstRows = np.zeros(numStates, dtype=np.intp)
+        self.firstRows[model.actingStates] = model.firstRows
+
+        # outcomes of every row, padded to the most outcomes of any row. The
+        # outcome is the first one whose cumulative probability exceeds a
+        # uniform draw, as in GridworldEnvironment.getRandomNextState
+        starts = np.searchsorted(model.rows, np.arange(numPairs + 1))
+        counts = np.diff(starts)
+        outcomes = np.arange(len(model.rows)) - starts[model.rows]
+        width = counts.max()
+        self.nextStates = np.zeros((numPairs, width), dtype=np.intp)
+        self.nextStates[model.rows, outcomes] = model.cols
+        self.rewards = np.zeros((numPairs, width))
+        self.rewards[model.rows, outcomes] = model.transitionRewards
+        probs = np.zeros((numPairs, width))
+        probs[model.rows, outcomes] = model.probs
+        self.cumulative = np.cumsum(probs, 1)
+        # the last outcome of a row takes any rounding shortfall
+        self.cumulative[np.arange(width) >= counts[:, None] - 1] = np.inf
+
+        self.startState = model.stateIndex[gridWorld.getStartState()]
+        self.random = np.random.RandomState(seed)
+        self.reset()
+
+    def getCurrentStates(self):
+        return self.states
+
+    def getNumActions(self, states):
+        return self.numActions[states]
+
+    def doActions(self, actions):
+        """
+          Takes one action in every environment and returns the arrays
+          (nextStates, rewards, done), done marking the episodes that
+          reached the terminal state and were reset.
+        """
+        rows = self.firstRows[self.states] + actions
+        draws = self.random.random_sample(len(rows))
+        outcomes = (draws[:, None] >= self.cumulative[rows]).sum(1)
+        nextStates = self.nextStates[rows, outcomes]
+        rewards = self.rewards[rows, outcomes]
+        done = self.numActions[nextStates] == 0
+        self.states = np.where(done, self.startState, nextStates)
+        return nextStates, rewards, done
+
+    def reset(self):
+        self.states = np.full(self.numEnvironments, self.startState, dtype=np.intp)
+
 class Grid:
     """
     A 2-dimensional array of immutables backed by a list of lists.  Data is accessed
@@ -377,6 +472,37 @@ def runEpisode(agent, environment, discount, decision, display, message, pause,
     if 'stopEpisode' in dir(agent):
         agent.stopEpisode()
 
+def runBatchEpisodes(agent, environment, numEpisodes, discount):
+    """
+      Trains agent on a BatchGridworldEnvironment without any display until
+      numEpisodes episodes have finished, and returns their discounted
+      returns in the order they finished.
+
+      The agent is fed whole batches through getBatchActions and
+      updateBatch of a QLearningAgent, and its actionFn must list the
+      actions of a state in gridworld getPossibleActions order.
+    """
+    legalCells = agent.QValues.legalCells(environment.model.states)
+    environment.reset()
+    returns = np.zeros(environment.numEnvironments)
+    discounts = np.ones(environment.numEnvironments)
+    finished = []
+    numFinished = 0
+    while numFinished < numEpisodes:
+        states = environment.getCurrentStates()
+        actions = agent.getBatchActions(legalCells[states])
+        nextStates, rewards, done = environment.doActions(actions)
+        agent.updateBatch(legalCells[states, actions], rewards, legalCells[nextStates])
+
+        returns += rewards * discounts
+        discounts *= discount
+        if done.any():
+            finished.append(returns[done])
+            numFinished += done.sum()
+            returns[done] = 0.0
+            discounts[done] = 1.0
+    return np.concatenate(finished)[:numEpisodes]
+
 def parseOptions():
     optParser = optparse.OptionParser()
     optParser.add_option('-d', '--discount',action='store',
@@ -408,7 +534,7 @@ def parseOptions():
                          help='Request a window width of X pixels *per grid cell* (default %default)')
     optParser.add_option('-a', '--agent',action='store', metavar="A",
                          type='string',dest='agent',default="random",
-                         help='Agent type (options are \'random\', \'value\' and \'q\', default %default)')
+                         help='Agent type (options are \'random\', \'value\', \'asynchvalue\', \'priosweepingvalue\' and \'q\', default %default)')
     optParser.add_option('-t', '--text',action='store_true',
                          dest='textDisplay',default=False,
                          help='Use text-only ASCII display')
@@ -424,6 +550,9 @@ def parseOptions():
     optParser.add_option('-m', '--manual',action='store_true',
                          dest='manual',default=False,
                          help='Manually control agent')
+    optParser.add_option('-b', '--batch',action='store', metavar="B",
+                         type='int',dest='batch',default=0,
+                         help='Train the q agent without display on B episodes at a time (default %default)')
     optParser.add_option('-v', '--valueSteps',action='store_true' ,default=False,
                          help='Display each step of value iteration')
 
@@ -483,6 +612,10 @@ if __name__ == '__main__':
     a = None
     if opts.agent == 'value':
         a = valueIterationAgents.ValueIterationAgent(mdp, opts.discount, opts.iters)
+    elif opts.agent == 'asynchvalue':
+        a = valueIterationAgents.AsynchronousValueIterationAgent(mdp, opts.discount, opts.iters)
+    elif opts.agent == 'priosweepingvalue':
+        a = valueIterationAgents.PrioritizedSweepingValueIterationAgent(mdp, opts.discount, opts.iters)
     elif opts.agent == 'q':
         #env.getPossibleActions, opts.discount, opts.learningRate, opts.epsilon
         #simulationFn = lambda agent, state: simulation.GridworldSimulation(agent,state,mdp)
@@ -519,7 +652,7 @@ if __name__ == '__main__':
     ###########################
     # DISPLAY Q/V VALUES BEFORE SIMULATION OF EPISODES
     try:
-        if not opts.manual and opts.agent == 'value':
+        if not opts.manual and opts.agent in ('value', 'asynchvalue', 'priosweepingvalue'):
             if opts.valueSteps:
                 for i in range(opts.iters):
                     tempAgent = valueIterationAgents.ValueIterationAgent(mdp, opts.discount, i)
@@ -542,7 +675,7 @@ if __name__ == '__main__':
             displayCallback = lambda state: display.displayNullValues(state)
         else:
             if opts.agent == 'random': displayCallback = lambda state: display.displayValues(a, state, "CURRENT VALUES")
-            if opts.agent == 'value': displayCallback = lambda state: display.displayValues(a, state, "CURRENT VALUES")
+            if opts.agent in ('value', 'asynchvalue', 'priosweepingvalue'): displayCallback = lambda state: display.displayValues(a, state, "CURRENT VALUES")
             if opts.agent == 'q': displayCallback = lambda state: display.displayQValues(a, state, "CURRENT Q-VALUES")
 
     messageCallback = lambda x: printString(x)
@@ -566,8 +699,12 @@ if __name__ == '__main__':
         print("RUNNING" + str(opts.episodes) + "EPISODES")
         print("\n")
     returns = 0
-    for episode in range(1, opts.episodes+1):
-        returns += runEpisode(a, env, opts.discount, decisionCallback, displayCallback, messageCallback, pauseCallback, episode)
+    if opts.batch > 0 and opts.agent == 'q' and not opts.manual:
+        batchEnv = BatchGridworldEnvironment(mdp, opts.batch)
+        returns = runBatchEpisodes(a, batchEnv, opts.episodes, opts.discount).sum()
+    else:
+        for episode in range(1, opts.episodes+1):
+            returns += runEpisode(a, env, opts.discount, decisionCallback, displayCallback, messageCallback, pauseCallback, episode)
     if opts.episodes > 0:
         print("\n")
         print("AVERAGE RETURNS FROM START STATE: " + str((returns+0.0) / opts.episodes))
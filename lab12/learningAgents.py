@@ -84,6 +84,10 @@ class ValueEstimationAgent(Agent):
         """
         util.raiseNotDefined()
 
+def legalActions(state):
+    # default actionFn, a module function so agents can be pickled
+    return state.getLegalActions()
+
 class ReinforcementAgent(ValueEstimationAgent):
     """
       Abstract Reinforcemnt Agent: A ValueEstimationAgent
@@ -170,7 +174,7 @@ class ReinforcementAgent(ValueEstimationAgent):
         numTraining - number of training episodes, i.e. no learning after these many episodes
         """
         if actionFn == None:
-            actionFn = lambda state: state.getLegalActions()
+            actionFn = legalActions
         self.actionFn = actionFn
         self.episodesSoFar = 0
         self.accumTrainRewards = 0.0
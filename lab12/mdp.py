@@ -13,6 +13,7 @@
 
 
 import random
+import numpy as np
 
 class MarkovDecisionProcess:
 
@@ -65,3 +66,156 @@ class MarkovDecisionProcess:
         are equivalent.
         """
         abstract
+
+
+# Largest number of (state-action pair, next state) entries compileMDP stores
+# as a dense matrix when it is not told which form to use
+DENSE_LIMIT = 1 << 20
+
+def compileMDP(mdp, dense=None):
+    """
+    Enumerate mdp once into a CompiledMDP. The transitions are kept as
+    a dense matrix if dense is True, as sparse arrays if it is False,
+    and if it is None whichever suits the size of the mdp.
+    """
+    return CompiledMDP(mdp, dense)
+
+class CompiledMDP:
+    """
+    Array form of a MarkovDecisionProcess, for algorithms that sweep
+    over every state such as value iteration.
+
+    getStates, getPossibleActions, getTransitionStatesAndProbs and
+    getReward are each called once per state or state-action pair.
+    Every (state, legal action) pair becomes a row with its
+    transition probabilities to every state and its expected reward,
+    so a Bellman backup over all states is one matrix-vector product
+    and a max per state. Terminal states get no rows and always have
+    value 0.
+
+    The rows of one state are contiguous and in the order
+    getPossibleActions returned the actions.
+    """
+    def __init__(self, mdp, dense=None):
+        self.states = list(mdp.getStates())
+        self.stateIndex = dict((state, i) for i, state in enumerate(self.states))
+
+        pairStates = []
+        self.pairActions = []
+        rows = []
+        cols = []
+        probs = []
+        rewards = []
+        for i, state in enumerate(self.states):
+            if mdp.isTerminal(state):
+                continue
+            for action in mdp.getPossibleActions(state):
+                row = len(pairStates)
+                pairStates.append(i)
+                self.pairActions.append(action)
+                for nextState, prob in mdp.getTransitionStatesAndProbs(state, action):
+                    rows.append(row)
+                    cols.append(self.stateIndex[nextState])
+                    probs.append(prob)
+                    rewards.append(mdp.getReward(state, action, nextState))
+
+        numStates = len(self.states)
+        numPairs = len(pairStates)
+        self.pairStates = np.array(pairStates, dtype=np.intp)
+        self.rows = np.array(rows, dtype=np.intp)
+        self.cols = np.array(cols, dtype=np.intp)
+        self.probs = np.array(probs, dtype=float)
+        # reward of every stored transition, and the expected reward of each pair
+        self.transitionRewards = np.array(rewards, dtype=float)
+        self.rewards = np.bincount(self.rows, self.probs * self.transitionRewards, minlength=numPairs)
+
+        # first row of every state that has actions, for reductions per state
+        self.actingStates = np.unique(self.pairStates)
+        self.firstRows = np.searchsorted(self.pairStates, self.actingStates)
+
+        # per state lists for the agents that back up one state at a time,
+        # built on first use
+        self.stateRows = None
+
+        if dense is None:
+            dense = numPairs * numStates <= DENSE_LIMIT
+        self.dense = dense
+        self.transitions = None
+        if dense:
+            self.transitions = np.zeros((numPairs, numStates))
+            np.add.at(self.transitions, (self.rows, self.cols), self.probs)
+
+    def qValues(self, values, discount):
+        """
+        Q-value of every pair under the state values array values.
+        """
+        if self.dense:
+            expected = self.transitions.dot(values)
+        else:
+            expected = np.bincount(self.rows, self.probs * values[self.cols], minlength=len(self.pairStates))
+        return self.rewards + discount * expected
+
+    def stateValues(self, qValues):
+        """
+        Largest Q-value of each state, 0 for states without actions.
+        """
+        values = np.zeros(len(self.states))
+        if len(self.firstRows):
+            values[self.actingStates] = np.maximum.reduceat(qValues, self.firstRows)
+        return values
+
+    def backup(self, values, discount):
+        """
+        One synchronous Bellman backup of every state.
+        """
+        return self.stateValues(self.qValues(values, discount))
+
+    def isActing(self, state):
+        """
+        Whether the state with index state has any rows.
+        """
+        if self.stateRows is None:
+            self._buildStateRows()
+        return len(self.stateRows[state]) > 0
+
+    def backupState(self, state, values, discount):
+        """
+        Bellman backup of the one state with index state from values, a
+        list or array of state values. 0 for states without actions.
+        """
+        if self.stateRows is None:
+            self._buildStateRows()
+        best = None
+        for reward, nextStates, probs in self.stateRows[state]:
+            qValue = reward
+            for nextState, prob in zip(nextStates, probs):
+                qValue += discount * prob * values[nextState]
+            if best is None or qValue > best:
+                best = qValue
+        if best is None:
+            return 0.0
+        return best
+
+    def predecessors(self):
+        """
+        For every state index, the set of state indices that can reach it
+        in one transition with nonzero probability.
+        """
+        predecessors = [set() for state in self.states]
+        states = self.pairStates[self.rows]
+        for state, nextState, prob in zip(states.tolist(), self.cols.tolist(), self.probs.tolist()):
+            if prob > 0:
+                predecessors[nextState].add(state)
+        return predecessors
+
+    def _buildStateRows(self):
+        # (expected reward, next state indices, probabilities) of each row,
+        # as plain lists grouped by state
+        self.stateRows = [[] for state in self.states]
+        starts = np.searchsorted(self.rows, np.arange(len(self.pairStates) + 1)).tolist()
+        rewards = self.rewards.tolist()
+        cols = self.cols.tolist()
+        probs = self.probs.tolist()
+        for row, state in enumerate(self.pairStates.tolist()):
+            start, end = starts[row], starts[row + 1]
+            self.stateRows[state].append((rewards[row], cols[start:end], probs[start:end]))
@@ -43,10 +43,11 @@ from game import GameStateData
 from game import Game
 from game import Directions
 from game import Actions
+from game import Configuration
 from util import nearestPoint
 from util import manhattanDistance
 import util, layout
-import sys, types, time, random, os
+import sys, types, time, random, os, pickle
 
 ###################################################
 # YOUR INTERFACE TO THE PACMAN WORLD: A GameState #
@@ -71,8 +72,10 @@ class GameState:
     # Accessor methods: use these to access state data #
     ####################################################
 
-    # static variable keeps track of which states have had getLegalActions called
+    # static variable keeps track of which states have had getLegalActions called,
+    # generateSuccessor only adds to it while trackExplored is set
     explored = set()
+    trackExplored = True
     def getAndResetExplored():
         tmp = GameState.explored.copy()
         GameState.explored = set()
@@ -112,7 +115,7 @@ class GameState:
         if agentIndex == 0:
             state.data.scoreChange += -TIME_PENALTY # Penalty for waiting around
         else:
-            GhostRules.decrementTimer( state.data.agentStates[agentIndex] )
+            GhostRules.decrementTimer( state.data.mutableAgentState(agentIndex) )
 
         # Resolve multi-agent effects
         GhostRules.checkDeath( state, agentIndex )
@@ -120,8 +123,9 @@ class GameState:
         # Book keeping
         state.data._agentMoved = agentIndex
         state.data.score += state.data.scoreChange
-        GameState.explored.add(self)
-        GameState.explored.add(state)
+        if GameState.trackExplored:
+            GameState.explored.add(self)
+            GameState.explored.add(state)
         return state
 
     def getLegalPacmanActions( self ):
@@ -146,9 +150,21 @@ class GameState:
         return self.data.agentStates[0].getPosition()
 
     def getGhostStates( self ):
+        """
+        Returns a list of AgentState objects for the ghosts (in game.py)
+
+        The states are shared with the states this one was generated from
+        and must only be read. Copy one with .copy() before changing it.
+        """
         return self.data.agentStates[1:]
 
     def getGhostState( self, agentIndex ):
+        """
+        Returns the AgentState object of the ghost at agentIndex (in game.py)
+
+        The state is shared with the states this one was generated from and
+        must only be read. Copy it with .copy() before changing it.
+        """
         if agentIndex == 0 or agentIndex >= self.getNumAgents():
             raise Exception("Invalid index passed to getGhostState")
         return self.data.agentStates[agentIndex]
@@ -221,7 +237,7 @@ class GameState:
         """
         Generates a new state by copying information from its predecessor.
         """
-        if prevState != None: # Initial state
+        if prevState is not None: # Initial state
             self.data = GameStateData(prevState.data)
         else:
             self.data = GameStateData()
@@ -342,7 +358,7 @@ class PacmanRules:
         if action not in legal:
             raise Exception("Illegal action " + str(action))
 
-        pacmanState = state.data.agentStates[0]
+        pacmanState = state.data.mutableAgentState(0)
 
         # Update Configuration
         vector = Actions.directionToVector( action, PacmanRules.PACMAN_SPEED )
@@ -371,11 +387,11 @@ class PacmanRules:
                 state.data._win = True
         # Eat capsule
         if( position in state.getCapsules() ):
-            state.data.capsules.remove( position )
+            state.data.capsules = [capsule for capsule in state.data.capsules if capsule != position]
             state.data._capsuleEaten = position
             # Reset all ghosts' scared timers
             for index in range( 1, len( state.data.agentStates ) ):
-                state.data.agentStates[index].scaredTimer = SCARED_TIME
+                state.data.mutableAgentState(index).scaredTimer = SCARED_TIME
     consume = staticmethod( consume )
 
 class GhostRules:
@@ -404,7 +420,7 @@ class GhostRules:
         if action not in legal:
             raise Exception("Illegal ghost action " + str(action))
 
-        ghostState = state.data.agentStates[ghostIndex]
+        ghostState = state.data.mutableAgentState(ghostIndex)
         speed = GhostRules.GHOST_SPEED
         if ghostState.scaredTimer > 0: speed /= 2.0
         vector = Actions.directionToVector( action, speed )
@@ -414,7 +430,8 @@ class GhostRules:
     def decrementTimer( ghostState):
         timer = ghostState.scaredTimer
         if timer == 1:
-            ghostState.configuration.pos = nearestPoint( ghostState.configuration.pos )
+            # configurations are shared between copies of an agent state
+            ghostState.configuration = Configuration( nearestPoint( ghostState.configuration.pos ), ghostState.configuration.direction )
         ghostState.scaredTimer = max( 0, timer - 1 )
     decrementTimer = staticmethod( decrementTimer )
 
@@ -435,10 +452,12 @@ class GhostRules:
 
     def collide( state, ghostState, agentIndex):
         if ghostState.scaredTimer > 0:
+            ghostState = state.data.mutableAgentState(agentIndex)
             state.data.scoreChange += 200
             GhostRules.placeGhost(state, ghostState)
             ghostState.scaredTimer = 0
             # Added for first-person
+            state.data._eaten = state.data._eaten[:]
             state.data._eaten[agentIndex] = True
         else:
             if not state.data._win:
@@ -523,6 +542,10 @@ def readCommand( argv ):
                       help='Turns on exception handling and timeouts during games', default=False)
     parser.add_option('--timeout', dest='timeout', type='int',
                       help=default('Maximum length of time an agent can spend computing in a single game'), default=30)
+    parser.add_option('--workers', dest='numWorkers', type='int',
+                      help='Play the games after training in this many processes, without graphics', default=None)
+    parser.add_option('--noExplored', action='store_true', dest='noExplored',
+                      help='Do not record generated states in GameState.explored', default=False)
 
     options, otherjunk = parser.parse_args(argv)
     if len(otherjunk) != 0:
@@ -532,6 +555,8 @@ def readCommand( argv ):
     # Fix the random seed
     if options.fixRandomSeed: random.seed('cs188')
 
+    if options.noExplored: GameState.trackExplored = False
+
     # Choose a layout
     args['layout'] = layout.getLayout( options.layout )
     if args['layout'] == None: raise Exception("The layout " + options.layout + " cannot be found")
@@ -570,6 +595,7 @@ def readCommand( argv ):
     args['record'] = options.record
     args['catchExceptions'] = options.catchExceptions
     args['timeout'] = options.timeout
+    args['numWorkers'] = options.numWorkers
 
     # Special case: recorded games don't use the runGames method or args structure
     if options.gameToReplay != None:
@@ -625,14 +651,20 @@ def replayGame( layout, actions, display ):
 
     display.finish()
 
-def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0, catchExceptions=False, timeout=30 ):
+def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0, catchExceptions=False, timeout=30, numWorkers=None ):
+    """
+    Plays numGames games, the first numTraining of them quietly.  With
+    numWorkers set, only the training games are played here and the rest
+    are spread over numWorkers processes, see runGamesInParallel.
+    """
     import __main__
     __main__.__dict__['_display'] = display
 
     rules = ClassicGameRules(timeout)
     games = []
+    parallel = numWorkers is not None
 
-    for i in range( numGames ):
+    for i in range( numTraining if parallel else numGames ):
         beQuiet = i < numTraining
         if beQuiet:
                 # Suppress output and graphics
@@ -646,13 +678,14 @@ def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0
         game.run()
         if not beQuiet: games.append(game)
 
-        if record:
-            import time, cPickle
-            fname = ('recorded-game-%d' % (i + 1)) +  '-'.join([str(t) for t in time.localtime()[1:6]])
-            f = file(fname, 'w')
-            components = {'layout': layout, 'actions': game.moveHistory}
-            cPickle.dump(components, f)
-            f.close()
+        if record: recordGame( layout, game, i )
+
+    if parallel and numGames > numTraining:
+        seed = random.randrange(1 << 30)
+        played = runGamesInParallel( layout, pacman, ghosts, numGames - numTraining, seed, numWorkers, catchExceptions, timeout )
+        for i, game in enumerate( played ):
+            games.append(game)
+            if record: recordGame( layout, game, numTraining + i )
 
     if (numGames-numTraining) > 0:
         scores = [game.state.getScore() for game in games]
@@ -665,6 +698,57 @@ def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0
 
     return games
 
+def recordGame( layout, game, i ):
+    import time, cPickle
+    fname = ('recorded-game-%d' % (i + 1)) +  '-'.join([str(t) for t in time.localtime()[1:6]])
+    f = file(fname, 'w')
+    components = {'layout': layout, 'actions': game.moveHistory}
+    cPickle.dump(components, f)
+    f.close()
+
+def runGamesInParallel( layout, pacman, ghosts, numGames, seed, numWorkers, catchExceptions=False, timeout=30 ):
+    """
+    Plays numGames games without graphics in a pool of numWorkers processes
+    and returns them in order, without their agents and display.
+
+    Every game starts from its own copy of the agents as passed in, with the
+    random module seeded with seed + its index, so the games do not depend
+    on numWorkers or on which process plays them.
+    """
+    import multiprocessing
+    components = pickle.dumps( (layout, pacman, ghosts), pickle.HIGHEST_PROTOCOL )
+    tasks = [(seed + i, catchExceptions, timeout) for i in range( numGames )]
+    if numWorkers <= 1:
+        _initGameWorker( components )
+        return [_playGame( task ) for task in tasks]
+    pool = multiprocessing.Pool( numWorkers, _initGameWorker, (components,) )
+    try:
+        chunksize = max( 1, len( tasks ) // (4 * numWorkers) )
+        return pool.map( _playGame, tasks, chunksize )
+    finally:
+        pool.close()
+        pool.join()
+
+# pickled (layout, pacman, ghosts) of the games a worker process plays
+_gameComponents = None
+
+def _initGameWorker( components ):
+    global _gameComponents
+    _gameComponents = components
+
+def _playGame( task ):
+    import textDisplay
+    seed, catchExceptions, timeout = task
+    layout, pacman, ghosts = pickle.loads( _gameComponents )
+    random.seed( seed )
+    rules = ClassicGameRules( timeout )
+    game = rules.newGame( layout, pacman, ghosts, textDisplay.NullGraphics(), True, catchExceptions )
+    game.run()
+    # agents and display stay behind, the game only carries its outcome back
+    game.agents = None
+    game.display = None
+    return game
+
 if __name__ == '__main__':
     """
     The main function called when pacman.py is run
@@ -17,6 +17,170 @@ from learningAgents import ReinforcementAgent
 from featureExtractors import *
 
 import random,util,math
+import numpy as np
+
+class QTable:
+    """
+      Q-values of a tabular learner in one contiguous numpy array.
+
+      States and actions are interned to integer ids the first time they
+      are seen and Q(state, action) is stored at index
+      stateId * width + actionId of a flat float64 array, so each Q-value
+      costs 8 bytes instead of a (state, action) key and a float object
+      in a dictionary. Each state also keeps the ids of its legal
+      actions, asked of actionFn once per state and shared between
+      states with the same actions, so the max over legal actions needs
+      neither actionFn nor any hashing of actions. Single cells are read
+      and written through a memoryview of the array, which is much
+      faster than indexing numpy one element at a time.
+
+      Unseen states and actions read as 0.0.
+    """
+    def __init__(self, actionFn, capacity=64, width=4):
+        self.actionFn = actionFn
+        self.stateIds = {}
+        self.actionIds = {}
+        self.actions = []
+        # tuple of legal action ids of every state, one tuple object for
+        # each distinct set of actions
+        self.legal = []
+        self.legalSets = {}
+        self.width = width
+        self._allocate(capacity, width)
+
+    def _allocate(self, capacity, width):
+        # copy the table into a new array of capacity states by width actions
+        values = np.zeros((capacity, width))
+        if len(self.legal):
+            values[:len(self.legal), :self.width] = self.values[:len(self.legal) * self.width].reshape(-1, self.width)
+        self.width = width
+        self.values = values.reshape(-1)
+        self.view = memoryview(self.values)
+
+    def stateId(self, state):
+        """
+          Id of state, interning it with its legal actions if it is new.
+        """
+        sid = self.stateIds.get(state)
+        if sid is None:
+            legal = tuple([self.actionId(action) for action in self.actionFn(state)])
+            legal = self.legalSets.setdefault(legal, legal)
+            sid = len(self.legal)
+            if (sid + 1) * self.width > len(self.values):
+                self._allocate(2 * (sid + 1), self.width)
+            self.legal.append(legal)
+            self.stateIds[state] = sid
+        return sid
+
+    def actionId(self, action):
+        """
+          Id of action, interning it if it is new.
+        """
+        aid = self.actionIds.get(action)
+        if aid is None:
+            aid = len(self.actions)
+            if aid == self.width:
+                self._allocate(len(self.values) // self.width, 2 * self.width)
+            self.actions.append(action)
+            self.actionIds[action] = aid
+        return aid
+
+    def cell(self, state, action):
+        """
+          Index of the cell of (state, action) in the flat array, interning
+          both if they are new. Indices stay valid until a new action is
+          interned.
+        """
+        sid = self.stateIds.get(state)
+        if sid is None:
+            sid = self.stateId(state)
+        aid = self.actionIds.get(action)
+        if aid is None:
+            aid = self.actionId(action)
+        return sid * self.width + aid
+
+    def legalCells(self, states):
+        """
+          Cells of the legal actions of each of states as a (states, actions)
+          array of indices into the flat array, padded with -1. All states
+          are interned before any cell is computed, so the cells stay valid
+          until a new action is interned.
+        """
+        sids = [self.stateId(state) for state in states]
+        width = max([len(self.legal[sid]) for sid in sids] + [1])
+        cells = np.full((len(sids), width), -1, dtype=np.intp)
+        for row, sid in enumerate(sids):
+            legal = self.legal[sid]
+            cells[row, :len(legal)] = [sid * self.width + aid for aid in legal]
+        return cells
+
+    def legalActions(self, state):
+        """
+          The legal actions of state, as actionFn returned them when the
+          state was first seen.
+        """
+        sid = self.stateIds.get(state)
+        if sid is None:
+            sid = self.stateId(state)
+        actions = self.actions
+        return [actions[aid] for aid in self.legal[sid]]
+
+    def __getitem__(self, key):
+        state, action = key
+        sid = self.stateIds.get(state)
+        aid = self.actionIds.get(action)
+        if sid is None or aid is None:
+            return 0.0
+        return self.view[sid * self.width + aid]
+
+    def __setitem__(self, key, value):
+        # find the cell first, interning may reallocate the array
+        cell = self.cell(*key)
+        self.view[cell] = value
+
+    def maxValue(self, state):
+        """
+          Largest Q-value over the legal actions of state, 0.0 if it has none.
+        """
+        sid = self.stateIds.get(state)
+        if sid is None:
+            sid = self.stateId(state)
+        legal = self.legal[sid]
+        if not legal:
+            return 0.0
+        base = sid * self.width
+        row = self.view[base:base + self.width]
+        return max(map(row.__getitem__, legal))
+
+    def bestActions(self, state):
+        """
+          The legal actions of state with the largest Q-value, in the order
+          actionFn returned them.
+        """
+        sid = self.stateIds.get(state)
+        if sid is None:
+            sid = self.stateId(state)
+        legal = self.legal[sid]
+        if not legal:
+            return []
+        base = sid * self.width
+        row = self.view[base:base + self.width]
+        qValues = list(map(row.__getitem__, legal))
+        best = max(qValues)
+        return [self.actions[legal[i]] for i, value in enumerate(qValues) if value == best]
+
+    def __len__(self):
+        return len(self.legal) * len(self.actions)
+
+    def __getstate__(self):
+        # a memoryview cannot be pickled or copied, it is rebuilt on load
+        state = self.__dict__.copy()
+        del state['view']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.view = memoryview(self.values)
 
 class QLearningAgent(ReinforcementAgent):
     """
@@ -43,7 +207,15 @@ class QLearningAgent(ReinforcementAgent):
         ReinforcementAgent.__init__(self, **args)
 
         "*** YOUR CODE HERE ***"
-        self.QValues = util.Counter()
+        # unseen (state, action) pairs read as 0 like they did from a Counter
+        self.QValues = QTable(self.actionFn)
+
+    def getLegalActions(self, state):
+        """
+          The legal actions of state, asked of actionFn only the
+          first time the state is seen.
+        """
+        return self.QValues.legalActions(state)
   
     def getQValue(self, state, action):
         """
@@ -64,18 +236,8 @@ class QLearningAgent(ReinforcementAgent):
           terminal state, you should return a value of 0.0.
         """
         "*** YOUR CODE HERE ***"
-        legalActions = self.getLegalActions(state)
-        
-        maxValue = None
-        for action in legalActions:
-            value = self.getQValue(state,action)
-            if maxValue == None or value > maxValue:
-                maxValue = value
-
-        if maxValue == None:
-            maxValue = 0.0
-
-        return maxValue
+        # the table knows the legal actions of every state it has seen
+        return self.QValues.maxValue(state)
 
     def computeActionFromQValues(self, state):
         """
@@ -84,19 +246,8 @@ class QLearningAgent(ReinforcementAgent):
           you should return None.
         """
         "*** YOUR CODE HERE ***"
-        legalActions = self.getLegalActions(state)
-        
-        bestAction = []
-        maxValue = None
-        for action in legalActions:
-            value = self.getQValue(state,action)
-            if maxValue == None or value > maxValue:
-                maxValue = value
-                del bestAction[:]
-                bestAction.append(action)
-            elif value == maxValue:
-                bestAction.append(action)
-                
+        bestAction = self.QValues.bestActions(state)
+
         if len(bestAction) == 0:
             return None
         else:
@@ -134,11 +285,47 @@ class QLearningAgent(ReinforcementAgent):
           it will be called on your behalf
         """
         "*** YOUR CODE HERE ***"
-        currentQValue = self.getQValue(state,action)
         nextQValue = self.computeValueFromQValues(nextState)
-        self.QValues[(state,action)] = currentQValue + self.alpha*(reward + (self.discount*nextQValue) - currentQValue)
+        # look the cell up once for both the read and the write, after the
+        # next state is interned since that may move the cells
+        cell = self.QValues.cell(state, action)
+        currentQValue = self.QValues.view[cell]
+        self.QValues.view[cell] = currentQValue + self.alpha*(reward + (self.discount*nextQValue) - currentQValue)
         
 
+    def getBatchActions(self, legalCells):
+        """
+          getAction for a batch of states at once. legalCells holds the
+          cells of each state's legal actions as QTable.legalCells returns
+          them, the result is the column of the chosen action in each row.
+          Ties between the best actions are broken at random.
+        """
+        legal = legalCells >= 0
+        qValues = np.where(legal, self.QValues.values[legalCells], -np.inf)
+        greedy = qValues == qValues.max(1)[:, None]
+        explore = np.random.random_sample(len(legalCells)) < self.epsilon
+        candidates = np.where(explore[:, None], legal, greedy)
+        # a uniform draw for every candidate, the largest one is chosen
+        return np.argmax(np.random.random_sample(candidates.shape) * candidates, 1)
+
+    def updateBatch(self, cells, rewards, nextLegalCells):
+        """
+          update for a batch of transitions at once, from the cells of the
+          (state, action) pairs taken, the rewards and the legal cells of
+          the next states as QTable.legalCells returns them.
+
+          All targets use the Q-values from before the batch. A cell taken
+          by several transitions moves once, by the mean of their errors.
+        """
+        values = self.QValues.values
+        legal = nextLegalCells >= 0
+        nextQValues = np.where(legal, values[nextLegalCells], -np.inf).max(1)
+        # states without legal actions are worth 0
+        nextQValues[~legal.any(1)] = 0.0
+        errors = rewards + self.discount * nextQValues - values[cells]
+        taken, inverse, counts = np.unique(cells, return_inverse=True, return_counts=True)
+        values[taken] += self.alpha * np.bincount(inverse, errors) / counts
+
     def getPolicy(self, state):
         return self.computeActionFromQValues(state)
 
@@ -189,10 +376,79 @@ class ApproximateQAgent(PacmanQAgent):
     def __init__(self, extractor='IdentityExtractor', **args):
         self.featExtractor = util.lookup(extractor, globals())()
         PacmanQAgent.__init__(self, **args)
-        self.weights = util.Counter()
+        # weights in a numpy vector indexed by feature id, the ids are given
+        # out to feature names as they are first extracted
+        self.featureIds = {}
+        self.featureNames = []
+        self.weightVector = np.zeros(16)
+        # (state, features) of the most recent states, see getStateFeatures
+        self.featureCache = []
 
     def getWeights(self):
-        return self.weights
+        """
+          Returns a Counter from feature names to their weights.
+        """
+        weights = util.Counter()
+        for name, weight in zip(self.featureNames, self.weightVector.tolist()):
+            weights[name] = weight
+        return weights
+
+    def featureId(self, name):
+        """
+          Index of the weight of feature name, adding it if it is new.
+        """
+        fid = self.featureIds.get(name)
+        if fid is None:
+            fid = len(self.featureNames)
+            if fid == len(self.weightVector):
+                self.weightVector = np.concatenate((self.weightVector, np.zeros(len(self.weightVector))))
+            self.featureNames.append(name)
+            self.featureIds[name] = fid
+        return fid
+
+    def getStateFeatures(self, state):
+        """
+          Returns (actions, rows, ids, values) where actions are the legal
+          actions of state and the feature vector of actions[i] is the
+          values at the ids whose row is i.
+
+          The features of all the actions are extracted together, and
+          kept for the last two states asked for. A step asks for the
+          current state, for the next state when updating, and for that
+          next state again when choosing the following action. With two
+          entries comparing states is much cheaper than hashing them,
+          and the same state object usually comes back anyway.
+        """
+        for key, cached in self.featureCache:
+            if key is state:
+                return cached
+        for key, cached in self.featureCache:
+            if key == state:
+                return cached
+        actions = list(self.actionFn(state))
+        featuresByAction = self.featExtractor.getFeaturesForActions(state, actions)
+        rows = []
+        ids = []
+        values = []
+        for row, action in enumerate(actions):
+            for name, value in featuresByAction[action].items():
+                rows.append(row)
+                ids.append(self.featureId(name))
+                values.append(value)
+        cached = (actions, np.array(rows, dtype=np.intp), np.array(ids, dtype=np.intp), np.array(values, dtype=float))
+        self.featureCache = [self.featureCache[-1], (state, cached)] if self.featureCache else [(state, cached)]
+        return cached
+
+    def getQValues(self, state):
+        """
+          Returns the legal actions of state and a numpy array of
+          their Q-values.
+        """
+        actions, rows, ids, values = self.getStateFeatures(state)
+        return actions, np.bincount(rows, values * self.weightVector[ids], minlength=len(actions))
+
+    def getLegalActions(self, state):
+        return self.getStateFeatures(state)[0]
 
     def getQValue(self, state, action):
         """
@@ -200,14 +456,40 @@ class ApproximateQAgent(PacmanQAgent):
           where * is the dotProduct operator
         """
         "*** YOUR CODE HERE ***"
-        util.raiseNotDefined()
+        actions, qValues = self.getQValues(state)
+        if action in actions:
+            return float(qValues[actions.index(action)])
+        # not a legal action, so not among the cached features
+        features = self.featExtractor.getFeatures(state, action)
+        return sum(self.weightVector[self.featureId(name)] * value for name, value in features.items())
+
+    def computeValueFromQValues(self, state):
+        actions, qValues = self.getQValues(state)
+        if not actions:
+            return 0.0
+        return float(qValues.max())
+
+    def computeActionFromQValues(self, state):
+        actions, qValues = self.getQValues(state)
+        if not actions:
+            return None
+        best = qValues.max()
+        return random.choice([action for action, value in zip(actions, qValues) if value == best])
 
     def update(self, state, action, nextState, reward):
         """
            Should update your weights based on transition
         """
         "*** YOUR CODE HERE ***"
-        util.raiseNotDefined()
+        difference = reward + self.discount * self.computeValueFromQValues(nextState) - self.getQValue(state, action)
+        actions, rows, ids, values = self.getStateFeatures(state)
+        if action in actions:
+            # each feature appears once in an action's vector
+            mask = rows == actions.index(action)
+            self.weightVector[ids[mask]] += self.alpha * difference * values[mask]
+        else:
+            for name, value in self.featExtractor.getFeatures(state, action).items():
+                self.weightVector[self.featureId(name)] += self.alpha * difference * value
 
     def final(self, state):
         "Called at the end of each game."
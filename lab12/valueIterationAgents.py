@@ -13,6 +13,9 @@
 
 
 import mdp, util
+import numpy as np
+
+from mdp import compileMDP
 
 from learningAgents import ValueEstimationAgent
 
@@ -45,31 +48,23 @@ class ValueIterationAgent(ValueEstimationAgent):
 
         # Write value iteration code here
         "*** YOUR CODE HERE ***"
-        # loop for as many iterations as was specified
+        self.model = compileMDP(mdp)
+        # number of single state backups done, to compare the agents
+        self.backups = 0
+        self.runValueIteration()
+
+    def runValueIteration(self):
+        # Enumerate the mdp once into arrays, then every iteration backs up all
+        # states at once from the previous iteration's values, which is the same
+        # as keeping a separate copy of the values while looping over the states
+        values = np.zeros(len(self.model.states))
         for k in range(self.iterations):
-            # Need to keep these seperate so we don't update some states while others
-            # in this iteration haven't been calculated. Once the whole iteration is 
-            # run will store back in the values variable
-            currentQValues = self.values.copy()
-            # get the states at each iteration and loop through            
-            states = self.mdp.getStates()
-            for state in states:
-                # get the possible actions for each state and loop through those so finding
-                # the max QValue for each state across all actions, then store in the qvalues table
-                maxQValue = None
-                actions = self.mdp.getPossibleActions(state)
-                for action in actions:
-                    qvalue = self.computeQValueFromValues(state, action)
-                    if maxQValue == None or maxQValue < qvalue:
-                        maxQValue = qvalue
-                
-                # Don't store the TERMINAL_STATE QValue since its always None and not needed
-                if state != "TERMINAL_STATE":
-                    currentQValues[state] = maxQValue
-                
-            # store the new qvalues
-            self.values = currentQValues
-            
+            values = self.model.backup(values, self.discount)
+            self.backups += len(self.model.actingStates)
+
+        # store the values by state for getValue and the Q-value computations
+        self.values.update(zip(self.model.states, values.tolist()))
+
     def getValue(self, state):
         """
           Return the value of the state (computed in __init__).
@@ -125,3 +120,92 @@ class ValueIterationAgent(ValueEstimationAgent):
 
     def getQValue(self, state, action):
         return self.computeQValueFromValues(state, action)
+
+
+class AsynchronousValueIterationAgent(ValueIterationAgent):
+    """
+        * Please read learningAgents.py before reading this.*
+
+        An AsynchronousValueIterationAgent takes a Markov decision process
+        (see mdp.py) on initialization and runs in-place (Gauss-Seidel)
+        value iteration: the states are backed up one at a time in
+        mdp.getStates() order, each from the latest values of the others.
+        Every backup counts as one of the iterations, and it stops early
+        once a whole pass over the states changes no value by more than
+        theta.
+    """
+    def __init__(self, mdp, discount = 0.9, iterations = 1000, theta = 1e-5):
+        self.theta = theta
+        ValueIterationAgent.__init__(self, mdp, discount, iterations)
+
+    def runValueIteration(self):
+        model = self.model
+        values = [0.0] * len(model.states)
+        numStates = len(values)
+        # largest change in the current pass over the states
+        change = 0.0
+        for k in range(self.iterations):
+            state = k % numStates
+            if k > 0 and state == 0:
+                if change <= self.theta:
+                    break
+                change = 0.0
+            if not model.isActing(state):
+                continue
+            value = model.backupState(state, values, self.discount)
+            self.backups += 1
+            change = max(change, abs(value - values[state]))
+            values[state] = value
+
+        self.values.update(zip(model.states, values))
+
+
+class PrioritizedSweepingValueIterationAgent(ValueIterationAgent):
+    """
+        * Please read learningAgents.py before reading this.*
+
+        A PrioritizedSweepingValueIterationAgent takes a Markov decision
+        process (see mdp.py) on initialization and runs prioritized sweeping
+        value iteration: the state whose value is furthest from its
+        Bellman backup is updated first, and only the predecessors of an
+        updated state are checked again. It does at most iterations
+        backups and stops early when no state is off by more than theta.
+    """
+    def __init__(self, mdp, discount = 0.9, iterations = 100, theta = 1e-5):
+        self.theta = theta
+        ValueIterationAgent.__init__(self, mdp, discount, iterations)
+
+    def runValueIteration(self):
+        model = self.model
+        values = [0.0] * len(model.states)
+        predecessors = model.predecessors()
+
+        # util.PriorityQueue pops the lowest priority and cannot change the
+        # priority of a queued state, so states are pushed with minus their
+        # error, again when it grows, and queued keeps the errors of the states
+        # still waiting so the older entries are skipped when they come out
+        queue = util.PriorityQueue()
+        queued = {}
+        def check(state):
+            error = abs(values[state] - model.backupState(state, values, self.discount))
+            if error > self.theta and error > queued.get(state, 0.0):
+                queue.push(state, -error)
+                queued[state] = error
+
+        for state in range(len(values)):
+            if model.isActing(state):
+                check(state)
+
+        k = 0
+        while k < self.iterations and not queue.isEmpty():
+            state = queue.pop()
+            if state not in queued:
+                continue
+            del queued[state]
+            values[state] = model.backupState(state, values, self.discount)
+            self.backups += 1
+            k += 1
+            for predecessor in predecessors[state]:
+                check(predecessor)
+
+        self.values.update(zip(model.states, values))
@@ -2,6 +2,10 @@ import json
 import random
 import math
 
+import numpy as np
+
+from utils import rotate_point
+
 
 # grid map class
 class CozGrid:
@@ -36,6 +40,17 @@ class CozGrid:
                     else:
                         raise ValueError('Cannot parse file')
 
+        # dense occupancy bitmap indexed [x, y], one extra row and column since
+        # is_in accepts x == width and y == height
+        self.occupancy = np.zeros((self.width + 1, self.height + 1), dtype=bool)
+        for col, row in self.occupied:
+            self.occupancy[col, row] = True
+
+        # marker poses (x, y, heading) in the map frame, one row per marker
+        self.marker_poses = np.array([parse_marker_info(m[0], m[1], m[2]) for m in self.markers], \
+            dtype=np.float64).reshape(-1, 3)
+        self.marker_index = MarkerIndex(self.marker_poses)
+
     def is_in(self, x, y):
         """ Determain whether the cell is in the grid map or not
             Argument: 
@@ -56,7 +71,20 @@ class CozGrid:
             return False
         yy = int(y) # self.height - int(y) - 1
         xx = int(x)
-        return (xx, yy) not in self.occupied 
+        return not self.occupancy[xx, yy]
+
+    def is_free_many(self, xs, ys):
+        """ Batched version of is_free
+            Argument:
+            xs, ys - arrays of X and Y in the cell map
+            Return: boolean numpy array, one result per point
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        inside = (xs >= 0) & (ys >= 0) & (xs <= self.width) & (ys <= self.height)
+        xx = np.where(inside, xs, 0).astype(int)
+        yy = np.where(inside, ys, 0).astype(int)
+        return inside & ~self.occupancy[xx, yy]
 
     def random_place(self):
         """ Return a random place in the map
@@ -77,6 +105,116 @@ class CozGrid:
             if self.is_free(x, y):
                 return x, y
 
+    def random_free_places(self, count):
+        """ Return count random places in the map which are free from obstacles
+            Argument: count - number of places
+            Return: xs, ys - numpy arrays of X and Y in the cell map
+        """
+        xs = np.empty(0)
+        ys = np.empty(0)
+        while len(xs) < count:
+            need = count - len(xs)
+            x = np.random.uniform(0, self.width, need)
+            y = np.random.uniform(0, self.height, need)
+            free = self.is_free_many(x, y)
+            xs = np.concatenate((xs, x[free]))
+            ys = np.concatenate((ys, y[free]))
+        return xs, ys
+
+
+# spatial index over the map markers
+class MarkerIndex:
+    """ Uniform bucket grid over marker positions, used to find the markers
+        within range and field of view of a pose without testing every marker
+        Argument:
+        marker_poses - (n, 3) array of marker x, y, heading in the map frame
+        bucket_size - bucket side length in grid units
+    """
+
+    def __init__(self, marker_poses, bucket_size=4.0):
+        self.poses = marker_poses
+        self.bucket_size = float(bucket_size)
+        self.buckets = {}
+        for i, (x, y, _) in enumerate(marker_poses):
+            self.buckets.setdefault(self._bucket(x, y), []).append(i)
+
+    def _bucket(self, x, y):
+        return int(math.floor(x / self.bucket_size)), int(math.floor(y / self.bucket_size))
+
+    def near(self, x, y, max_range=None):
+        """ Indices of the markers in the buckets overlapping the square of
+            half side max_range around (x, y), all markers if max_range is None
+            Return: sorted list of marker indices
+        """
+        if max_range is None:
+            return list(range(len(self.poses)))
+        bx0, by0 = self._bucket(x - max_range, y - max_range)
+        bx1, by1 = self._bucket(x + max_range, y + max_range)
+        found = []
+        # walk whichever is smaller, the buckets in the square or the non-empty ones
+        if (bx1 - bx0 + 1) * (by1 - by0 + 1) < len(self.buckets):
+            for bx in range(bx0, bx1 + 1):
+                for by in range(by0, by1 + 1):
+                    found.extend(self.buckets.get((bx, by), ()))
+        else:
+            for (bx, by), indices in self.buckets.items():
+                if bx0 <= bx <= bx1 and by0 <= by <= by1:
+                    found.extend(indices)
+        return sorted(found)
+
+    def visible(self, x, y, heading_deg, fov_deg, max_range=None):
+        """ Markers within max_range of (x, y) and inside the field of view
+            fov_deg centered on heading_deg
+            Return: sorted list of marker indices
+        """
+        result = []
+        for i in self.near(x, y, max_range):
+            m_x, m_y, _ = self.poses[i]
+            if max_range is not None and math.hypot(m_x - x, m_y - y) > max_range:
+                continue
+            mr_x, mr_y = rotate_point(m_x - x, m_y - y, -heading_deg)
+            if math.fabs(math.degrees(math.atan2(mr_y, mr_x))) < fov_deg / 2.0:
+                result.append(i)
+        return result
+
+    def visible_many(self, xs, ys, headings_deg, fov_deg, max_range=None):
+        """ Batched version of visible for many poses
+            Poses are grouped by bucket and only tested against the markers
+            near their bucket
+            Return: boolean numpy array, [pose, marker] is True if visible
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        theta = np.radians(np.asarray(headings_deg, dtype=np.float64))
+        result = np.zeros((len(xs), len(self.poses)), dtype=bool)
+        if len(self.poses) == 0:
+            return result
+
+        if max_range is None:
+            groups = [(np.arange(len(xs)), np.arange(len(self.poses)))]
+        else:
+            bx = np.floor(xs / self.bucket_size).astype(np.int64)
+            by = np.floor(ys / self.bucket_size).astype(np.int64)
+            keys, inverse = np.unique(np.stack((bx, by), axis=1), axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+            # any pose in a bucket is within half a diagonal of its center
+            reach = max_range + self.bucket_size * math.sqrt(0.5)
+            groups = []
+            for k, (kx, ky) in enumerate(keys):
+                candidates = self.near((kx + 0.5) * self.bucket_size, (ky + 0.5) * self.bucket_size, reach)
+                if candidates:
+                    groups.append((np.nonzero(inverse == k)[0], np.array(candidates)))
+
+        for poses, markers in groups:
+            dx = self.poses[markers, 0] - xs[poses, None]
+            dy = self.poses[markers, 1] - ys[poses, None]
+            c, s = np.cos(-theta[poses, None]), np.sin(-theta[poses, None])
+            in_view = np.abs(np.degrees(np.arctan2(dx * s + dy * c, dx * c - dy * s))) < fov_deg / 2.0
+            if max_range is not None:
+                in_view &= np.hypot(dx, dy) <= max_range
+            result[poses[:, None], markers[None, :]] = in_view
+        return result
+
 
 # parse marker position and orientation
 # input: grid position and orientation char from JSON file
@@ -1,6 +1,8 @@
 import random
 import math
 
+import numpy as np
+
 from utils import *
 from grid import *
 from setting import *
@@ -56,17 +58,109 @@ class Particle(object):
                     rh -- marker's relative heading in robot's frame, in degree
         """
         marker_list = []
-        for marker in grid.markers:
-            m_x, m_y, m_h = parse_marker_info(marker[0], marker[1], marker[2])
+        for i in grid.marker_index.visible(self.x, self.y, self.h, ROBOT_CAMERA_FOV_DEG, ROBOT_CAMERA_RANGE):
+            m_x, m_y, m_h = grid.marker_poses[i]
             # rotate marker into robot frame
             mr_x, mr_y = rotate_point(m_x - self.x, m_y - self.y, -self.h)
-            if math.fabs(math.degrees(math.atan2(mr_y, mr_x))) < ROBOT_CAMERA_FOV_DEG / 2.0:
-                mr_h = diff_heading_deg(m_h, self.h)
-                marker_list.append((mr_x, mr_y, mr_h))
+            mr_h = diff_heading_deg(m_h, self.h)
+            marker_list.append((mr_x, mr_y, mr_h))
         return marker_list
 
 
 
+""" ParticleArray class
+    A particle set stored as structure-of-arrays: x, y and h are float64 numpy
+    arrays of the same length, w holds the normalized importance weights.
+    It is used by the vectorized filter engine and behaves like a read-only
+    list of Particle for the GUI and autograder
+"""
+class ParticleArray(object):
+
+    def __init__(self, x, y, h, w=None):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.h = np.asarray(h, dtype=np.float64)
+        if w is None:
+            w = np.full(len(self.x), 1.0 / max(len(self.x), 1))
+        self.w = np.asarray(w, dtype=np.float64)
+        # short and long term average of the measurement likelihood,
+        # used to decide how many random particles to inject
+        self.w_slow = 0.0
+        self.w_fast = 0.0
+
+    def __len__(self):
+        return len(self.x)
+
+    def __getitem__(self, i):
+        # returns a copy, changing it does not change the particle set
+        return Particle(float(self.x[i]), float(self.y[i]), float(self.h[i]))
+
+    def __iter__(self):
+        for i in range(len(self.x)):
+            yield self[i]
+
+    def __repr__(self):
+        return "ParticleArray(%d particles)" % len(self.x)
+
+    @classmethod
+    # create some random particles
+    def create_random(cls, count, grid):
+        x, y = grid.random_free_places(count)
+        h = np.random.uniform(0, 360, count)
+        return cls(x, y, h)
+
+    @classmethod
+    def from_particles(cls, particles):
+        """ Build a particle array from a list of Particle
+            A ParticleArray is returned as it is
+        """
+        if isinstance(particles, ParticleArray):
+            return particles
+        return cls([p.x for p in particles], [p.y for p in particles], [p.h for p in particles])
+
+    def to_particles(self):
+        return [Particle(x, y, h) for x, y, h in zip(self.x.tolist(), self.y.tolist(), self.h.tolist())]
+
+    def with_poses(self, x, y, h):
+        """ Return a new particle array with new poses but the same weights and filter state
+        """
+        moved = ParticleArray(x, y, h, self.w)
+        moved.w_slow, moved.w_fast = self.w_slow, self.w_fast
+        return moved
+
+    def with_weights(self, w):
+        """ Return a new particle array with the same poses and filter state but new weights
+        """
+        reweighted = ParticleArray(self.x, self.y, self.h, w)
+        reweighted.w_slow, reweighted.w_fast = self.w_slow, self.w_fast
+        return reweighted
+
+    def take(self, indices):
+        """ Return a new particle array with the particles at indices
+            The new array has uniform weights, as after resampling
+        """
+        return ParticleArray(self.x[indices], self.y[indices], self.h[indices])
+
+    def concatenate(self, other):
+        count = len(self) + len(other)
+        w = np.concatenate((self.w * len(self), other.w * len(other))) / max(count, 1)
+        return ParticleArray(np.concatenate((self.x, other.x)), np.concatenate((self.y, other.y)), \
+            np.concatenate((self.h, other.h)), w)
+
+    def mean_pose(self, confident_dist=1):
+        """ Vectorized version of compute_mean_pose in utils.py, weighted by w
+        """
+        if len(self.x) == 0:
+            return -1, -1, 0, False
+        m_x = float(np.average(self.x, weights=self.w))
+        m_y = float(np.average(self.y, weights=self.w))
+        h = np.radians(self.h)
+        m_h = math.degrees(math.atan2(np.average(np.sin(h), weights=self.w), np.average(np.cos(h), weights=self.w)))
+        m_weight = self.w[np.hypot(self.x - m_x, self.y - m_y) < confident_dist].sum()
+        return m_x, m_y, m_h, bool(m_weight > self.w.sum() * 0.95)
+
+
+
 """ Robot class
     A class for robot, contains same x, y, and heading information as particles
     but with some more utitilies for robot motion / collision checking
@@ -29,6 +29,7 @@ class GUIWindow():
 
         self.particles = []
         self.robot = None
+        self.master = None
 
         print("Occupied: ")
         print(self.occupied)
@@ -172,6 +173,7 @@ class GUIWindow():
     def update(self):
         self.lock.acquire()
         self.clean_world()
+        self.master.wm_title(self.title())
         self._show_particles(self.particles)
         self._show_mean(self.mean_x, self.mean_y, self.mean_heading, self.mean_confident)
         if self.robot != None:
@@ -181,10 +183,15 @@ class GUIWindow():
         self.lock.release()
         # self.updateflag = False
 
+    def title(self):
+        # the particle count changes with PARTICLE_COUNT_ADAPTIVE
+        return "Particle Filter (%d particles): Grey/Green - estimated, Red - ground truth" % len(self.particles)
+
     # start GUI thread
     def start(self):
         master = Tk()
-        master.wm_title("Particle Filter: Grey/Green - estimated, Red - ground truth")
+        self.master = master
+        master.wm_title(self.title())
 
         self.canvas = Canvas(master, width = self.grid.width * self.grid.scale, height = self.grid.height * self.grid.scale, bd = 0, bg = '#FFFFFF')
         self.canvas.pack()
@@ -1,7 +1,10 @@
 from grid import *
-from particle import Particle
+from particle import Particle, ParticleArray
+from resampling import RESAMPLERS, effective_sample_size, kld_sample_count
 from utils import *
 from setting import *
+import numpy as np
+import math
 
 
 def motion_update(particles, odom):
@@ -15,6 +18,8 @@ def motion_update(particles, odom):
         Returns: the list of particles represents belief \tilde{p}(x_{t} | u_{t})
                 after motion update
     """
+    if USE_PARTICLE_ARRAY or isinstance(particles, ParticleArray):
+        return motion_update_array(ParticleArray.from_particles(particles), odom)
     motion_particles = []
     return motion_particles
 
@@ -43,7 +48,151 @@ def measurement_update(particles, measured_marker_list, grid):
         Returns: the list of particles represents belief p(x_{t} | u_{t})
                 after measurement update
     """
+    if USE_PARTICLE_ARRAY or isinstance(particles, ParticleArray):
+        return measurement_update_array(ParticleArray.from_particles(particles), measured_marker_list, grid)
     measured_particles = []
     return measured_particles
 
 
+# ------------------------------------------------------------------------
+# Vectorized engine
+#
+# The functions below do the same work as motion_update and measurement_update
+# but on a ParticleArray, so each step is a handful of numpy operations over
+# all particles instead of a python loop building matrices per particle.
+# ------------------------------------------------------------------------
+
+##
+# Same as add_heading_deg / diff_heading_deg in utils.py for numpy arrays,
+# returns headings in range (-180, 180] in deg
+##
+def wrap_heading_deg_array(h):
+    return 180.0 - np.mod(180.0 - h, 360.0)
+
+# inverse variances of the marker measurement Gaussian (diagonal of sigma_inv)
+marker_trans_inv_var = 1.0 / MARKER_TRANS_SIGMA**2
+marker_rot_inv_var = 1.0 / math.radians(MARKER_ROT_SIGMA)**2
+
+def motion_update_array(particles, odom):
+    """ Vectorized particle filter motion update
+
+        Arguments:
+        particles -- ParticleArray represents belief p(x_{t-1} | u_{t-1})
+                before motion update
+        odom -- odometry to move (dx, dy, dh) in *robot local frame*
+
+        Returns: a new ParticleArray represents belief \tilde{p}(x_{t} | u_{t})
+                after motion update
+    """
+    count = len(particles)
+    theta = np.radians(particles.h)
+    c, s = np.cos(theta), np.sin(theta)
+    x = particles.x + c * odom[0] - s * odom[1] + np.random.normal(0.0, ODOM_TRANS_SIGMA, count)
+    y = particles.y + s * odom[0] + c * odom[1] + np.random.normal(0.0, ODOM_TRANS_SIGMA, count)
+    h = wrap_heading_deg_array(particles.h + odom[2]) + np.random.normal(0.0, ODOM_HEAD_SIGMA, count)
+    return particles.with_poses(x, y, h)
+
+def marker_association_array(particles, measured_marker_list, grid):
+    """ Associate every measured marker of every particle with its best matching map marker
+
+        Returns: best, likelihood -- two (particles x measured markers) arrays,
+                the index in grid.markers of the best matching map marker and
+                the Gaussian likelihood of that match
+    """
+    measured = np.asarray(measured_marker_list, dtype=np.float64).reshape(-1, 3)
+    theta = np.radians(particles.h)[:, None]
+    c, s = np.cos(theta), np.sin(theta)
+    # measured markers in the map frame for every particle
+    px = particles.x[:, None] + c * measured[None, :, 0] - s * measured[None, :, 1]
+    py = particles.y[:, None] + s * measured[None, :, 0] + c * measured[None, :, 1]
+    ph = particles.h[:, None] + measured[None, :, 2]
+    # (particle, measured marker, map marker) triples
+    m_x, m_y, m_h = grid.marker_poses[:, 0], grid.marker_poses[:, 1], grid.marker_poses[:, 2]
+    dx = px[:, :, None] - m_x
+    dy = py[:, :, None] - m_y
+    dh = np.radians(wrap_heading_deg_array(ph[:, :, None] - m_h))
+    exponent = (dx * dx + dy * dy) * marker_trans_inv_var + dh * dh * marker_rot_inv_var
+    # the best match has the smallest exponent, only take exp of that one
+    best = np.argmin(exponent, axis=2)
+    likelihood = np.exp(-0.5 * np.take_along_axis(exponent, best[:, :, None], axis=2)[:, :, 0])
+    return best, likelihood
+
+def measurement_weights_array(particles, measured_marker_list, grid):
+    """ Un-normalized weight of each particle, the sum over measured markers of the
+        best matching map marker likelihood, 0 for particles not in free space
+    """
+    _, likelihood = marker_association_array(particles, measured_marker_list, grid)
+    weights = likelihood.sum(axis=1)
+    weights[~grid.is_free_many(particles.x, particles.y)] = 0.0
+    return weights
+
+def random_particle_fraction(particles, avg_likelihood):
+    """ Fraction of the particles to replace by random ones (augmented MCL)
+        Tracks a short and a long term average of the measurement likelihood
+        on the particle array and injects more random particles the further
+        the short term average drops below the long term one
+    """
+    if particles.w_slow <= 0:
+        particles.w_slow = particles.w_fast = avg_likelihood
+    else:
+        particles.w_slow += RANDOM_ALPHA_SLOW * (avg_likelihood - particles.w_slow)
+        particles.w_fast += RANDOM_ALPHA_FAST * (avg_likelihood - particles.w_fast)
+    return min(RANDOM_MAX_FRACTION, max(0.0, 1.0 - particles.w_fast / particles.w_slow))
+
+def kld_resample(particles, weights, random_fraction, grid):
+    """ Resample with KLD-sampling. Candidates are drawn from the weights with
+        random_fraction of them random particles, and the bins are counted
+        over the candidates spread by the motion noise, so a filter that is
+        lost or spread out by the noise keeps more particles
+    """
+    num_random = int(KLD_MAX_PARTICLES * random_fraction)
+    candidates = particles.take(RESAMPLERS[RESAMPLER](weights, KLD_MAX_PARTICLES - num_random)) \
+        .concatenate(ParticleArray.create_random(num_random, grid))
+    candidates = candidates.take(np.random.permutation(KLD_MAX_PARTICLES))
+    x = candidates.x + np.random.normal(0.0, ODOM_TRANS_SIGMA, KLD_MAX_PARTICLES)
+    y = candidates.y + np.random.normal(0.0, ODOM_TRANS_SIGMA, KLD_MAX_PARTICLES)
+    h = candidates.h + np.random.normal(0.0, ODOM_HEAD_SIGMA, KLD_MAX_PARTICLES)
+    count = kld_sample_count(x, y, h, KLD_BIN_SIZE, KLD_BIN_ANGLE, KLD_EPSILON, KLD_DELTA, KLD_MIN_PARTICLES)
+    return candidates.take(np.arange(count))
+
+def measurement_update_array(particles, measured_marker_list, grid):
+    """ Vectorized particle filter measurement update
+
+        Arguments:
+        particles -- ParticleArray represents belief \tilde{p}(x_{t} | u_{t})
+                before meansurement update (but after motion update)
+        measured_marker_list -- robot detected marker list, same format as measurement_update
+        grid -- grid world map, which contains the marker information
+
+        Returns: a ParticleArray represents belief p(x_{t} | u_{t})
+                after measurement update. The particles are only resampled
+                when the effective sample size drops below
+                RESAMPLE_ESS_THRESHOLD or random particles are injected, and
+                else come back with new weights. With PARTICLE_COUNT_ADAPTIVE
+                they are resampled to the count KLD-sampling picks, which is
+                len() of the result
+    """
+    if len(measured_marker_list) == 0 or len(grid.markers) == 0:
+        return particles
+
+    num_particles = len(particles)
+    weights = particles.w * measurement_weights_array(particles, measured_marker_list, grid)
+    sum_w = weights.sum()
+    if sum_w <= 0:
+        # no particle explains the measurement, start over
+        return ParticleArray.create_random(num_particles, grid)
+    weights /= sum_w
+
+    # sum_w is the likelihood of the measurement under the current belief
+    random_fraction = random_particle_fraction(particles, sum_w / len(measured_marker_list))
+
+    num_random = int(num_particles * random_fraction)
+    if num_random == 0 and effective_sample_size(weights) >= RESAMPLE_ESS_THRESHOLD * num_particles:
+        return particles.with_weights(weights)
+    if PARTICLE_COUNT_ADAPTIVE:
+        resampled = kld_resample(particles, weights, random_fraction, grid)
+    else:
+        indices = RESAMPLERS[RESAMPLER](weights, num_particles - num_random)
+        resampled = particles.take(indices).concatenate(ParticleArray.create_random(num_random, grid))
+    resampled.w_slow, resampled.w_fast = particles.w_slow, particles.w_fast
+    return resampled
@@ -0,0 +1,104 @@
+""" Resampling stage for the vectorized particle filter
+    Every resampler takes normalized particle weights and the number of
+    particles to draw, and returns the indices of the drawn particles.
+    RESAMPLERS maps the names accepted by RESAMPLER in setting.py to them.
+    kld_sample_count picks the particle count for KLD-sampling.
+"""
+
+from statistics import NormalDist
+
+import numpy as np
+
+# cumulative distribution of the weights, with the last entry exactly 1
+def cumulative_weights(weights):
+    distribution = np.cumsum(weights)
+    distribution /= distribution[-1]
+    distribution[-1] = 1.0
+    return distribution
+
+# draw count indices at the given sorted positions in [0, 1)
+def draw_at(weights, positions):
+    indices = np.searchsorted(cumulative_weights(weights), positions, side='right')
+    return np.minimum(indices, len(weights) - 1)
+
+def multinomial_resample(weights, count):
+    """ Independent draws, one random number per particle (what lab8 did with bisect)
+    """
+    return draw_at(weights, np.sort(np.random.uniform(0, 1, count)))
+
+def systematic_resample(weights, count):
+    """ Low-variance resampler: one random offset, count evenly spaced positions
+        The number of copies of every particle is read straight off the
+        cumulative weights, so no search is needed
+    """
+    if count == 0:
+        return np.zeros(0, dtype=int)
+    u = np.random.uniform(0, 1)
+    # number of positions (u + j) / count below each cumulative weight
+    below = np.clip(np.ceil(cumulative_weights(weights) * count - u), 0, count).astype(int)
+    copies = np.diff(np.concatenate(([0], below)))
+    return np.repeat(np.arange(len(weights)), copies)
+
+def stratified_resample(weights, count):
+    """ One random position inside each of count equal strata of [0, 1)
+    """
+    return draw_at(weights, (np.arange(count) + np.random.uniform(0, 1, count)) / count)
+
+def residual_resample(weights, count):
+    """ Keep floor(count * w) copies of every particle, then draw the rest
+        systematically from the remaining fractional weights
+    """
+    expected = np.asarray(weights) * count
+    copies = np.floor(expected).astype(int)
+    indices = np.repeat(np.arange(len(weights)), copies)
+    remaining = count - len(indices)
+    if remaining > 0:
+        residual = expected - copies
+        indices = np.concatenate((indices, systematic_resample(residual / residual.sum(), remaining)))
+    return indices
+
+RESAMPLERS = {
+    'multinomial': multinomial_resample,
+    'systematic': systematic_resample,
+    'stratified': stratified_resample,
+    'residual': residual_resample,
+}
+
+def effective_sample_size(weights):
+    """ Effective number of particles 1 / sum(w^2) for normalized weights,
+        equal to the particle count when all weights are the same
+    """
+    return 1.0 / np.sum(np.square(weights))
+
+def kld_bound(k, epsilon, delta):
+    """ Number of samples needed so that, with probability 1 - delta, the
+        KL divergence between the sample based belief and the true one stays
+        below epsilon, when the belief covers k histogram bins (Fox, KLD-sampling)
+    """
+    k = np.maximum(np.asarray(k, dtype=np.float64), 2.0)
+    z = NormalDist().inv_cdf(1.0 - delta)
+    a = 2.0 / (9.0 * (k - 1.0))
+    return np.ceil((k - 1.0) / (2.0 * epsilon) * (1.0 - a + np.sqrt(a) * z) ** 3).astype(int)
+
+def kld_sample_count(x, y, h, bin_size, bin_angle, epsilon, delta, min_count):
+    """ KLD-sampling over already drawn particles (in random order)
+        Walks the particles in order, counting the histogram bins of
+        size bin_size x bin_size x bin_angle they fall in, and returns how
+        many of them to keep: the first prefix that is as long as the KLD
+        bound for the bins it covers, or all of them if there is none
+    """
+    count = len(x)
+    bx = np.floor(x / bin_size).astype(np.int64)
+    by = np.floor(y / bin_size).astype(np.int64)
+    bh = np.floor(np.mod(h, 360.0) / bin_angle).astype(np.int64)
+    # distinct bins seen in every prefix
+    keys = np.stack((bx, by, bh), axis=1)
+    _, first = np.unique(keys, axis=0, return_index=True)
+    new_bin = np.zeros(count, dtype=int)
+    new_bin[first] = 1
+    bins = np.cumsum(new_bin)
+    needed = np.maximum(kld_bound(bins, epsilon, delta), min_count)
+    done = np.nonzero(np.arange(1, count + 1) >= needed)[0]
+    if len(done) == 0:
+        return count
+    return int(done[0]) + 1
@@ -1,6 +1,25 @@
 
 PARTICLE_COUNT = 5000       # Total number of particles in your filter
 
+USE_PARTICLE_ARRAY = True   # Run the filter on the vectorized numpy engine (ParticleArray)
+
+# resampling stage of the vectorized engine
+RESAMPLER = 'systematic'    # multinomial, systematic, stratified or residual
+RESAMPLE_ESS_THRESHOLD = 0.5    # resample when effective sample size < threshold * particle count
+RANDOM_ALPHA_SLOW = 0.05    # decay of the long term measurement likelihood average
+RANDOM_ALPHA_FAST = 0.5     # decay of the short term measurement likelihood average
+RANDOM_MAX_FRACTION = 0.1   # at most this fraction of particles is replaced by random ones
+
+# KLD-sampling: adapt the particle count to the spread of the belief, starting from PARTICLE_COUNT.
+# Resampling is still gated by RESAMPLE_ESS_THRESHOLD, the count is shown in the GUI title
+PARTICLE_COUNT_ADAPTIVE = False
+KLD_MIN_PARTICLES = 300
+KLD_MAX_PARTICLES = 20000
+KLD_EPSILON = 0.05          # max KL divergence between sample based and true belief
+KLD_DELTA = 0.01            # probability that the bound does not hold
+KLD_BIN_SIZE = 1.0          # histogram bin size in grid units
+KLD_BIN_ANGLE = 15          # histogram bin size in deg
+
 # odometry Gaussian noise model
 ODOM_TRANS_SIGMA = 0.01     # translational err in inch (grid unit)
 ODOM_HEAD_SIGMA = 0.5         # rotational err in deg
@@ -12,3 +31,4 @@ MARKER_ROT_SIGMA = 20        # rotational err in deg
 PARTICLE_MAX_SHOW = 500     # Max number of particles to be shown in GUI (for speed up)
 
 ROBOT_CAMERA_FOV_DEG = 45   # Robot camera FOV in degree
+ROBOT_CAMERA_RANGE = None   # Max distance the camera sees a marker in grid units, None for unlimited
@@ -34,6 +34,10 @@ def compute_mean_pose(particles, confident_dist=1):
     	This is not part of the particle filter algorithm but rather an
     	addition to show the "best belief" for current pose
     """
+    # particle arrays compute it with numpy
+    if hasattr(particles, 'mean_pose'):
+        return particles.mean_pose(confident_dist)
+
     m_x, m_y, m_count = 0, 0, 0
     # for rotation average
     m_hx, m_hy = 0, 0